@@ -3,11 +3,13 @@
 # bladeRF or hackrf 
 # grab a pic converts it then Creates a bin file and plays it.
 
-import os, time, threading, subprocess, shutil, queue, multiprocessing as mp
+import os, re, sys, time, threading, shutil, queue, hashlib, argparse, collections, tracemalloc, json, contextlib, weakref
+import multiprocessing as mp
+from multiprocessing import shared_memory
 import numpy as np
 from PIL import Image, ImageOps, ImageDraw, ImageFont
-import tkinter as tk
-from tkinter import filedialog, messagebox, END, NORMAL, DISABLED
+# The GUI (sdrpainter_gui, tkinter) and radio wrappers (sdrpainter_radio) are imported on
+# demand, so headless rendering starts fast and needs neither Tk nor the SDR tools.
 
 # ---------- Defaults ----------
 DEFAULT_TEXT = "HELLO"
@@ -19,219 +21,337 @@ DEFAULT_GAIN_DB  = 30           # bladeRF: overall; HackRF: VGA (0..47)
 DEFAULT_W, DEFAULT_H = 1024, 512
 DEFAULT_USB_MODE = True
 
-# ---------- Dark theme ----------
-CLR_BG    = "#0f1115"
-CLR_PANEL = "#141821"
-CLR_TEXT  = "#e6e6e6"
-CLR_MUTED = "#a6a6a6"
-CLR_BTN   = "#1f2430"
-CLR_BTN_H = "#2a3142"
-CLR_EDIT  = "#1a1f2b"
-CLR_EDIT_TXT = "#ffffff"
-CLR_ACCENT= "#2ea043"
-
 FONT_CANDIDATES = [
     "DejaVuSansMono-Bold.ttf", "Consolas.ttf", "Courier New.ttf",
     r"C:\Windows\Fonts\consolab.ttf", r"C:\Windows\Fonts\consola.ttf",
 ]
 
-# ---------- bladeRF-cli discovery ----------
-def find_bladerf_cli():
-    for p in [r"C:\bladeRF\bladeRF-cli.exe",
-              r"C:\Program Files\Nuand\bladeRF\bladeRF-cli.exe",
-              r"C:\Program Files (x86)\Nuand\bladeRF\bladeRF-cli.exe"]:
-        if os.path.isfile(p): return p
-    for name in ("bladeRF-cli.exe","bladerf-cli.exe","bladeRF-cli","bladerf-cli"):
-        p = shutil.which(name)
-        if p: return p
-    return None
-
-# ---------- hackrf_transfer discovery ----------
-def find_hackrf_transfer():
-    for p in [r"C:\Program Files\HackRF\hackrf_transfer.exe",
-              r"C:\Program Files (x86)\HackRF\hackrf_transfer.exe",
-              r"C:\hackrf\hackrf_transfer.exe"]:
-        if os.path.isfile(p): return p
-    p = shutil.which("hackrf_transfer.exe") or shutil.which("hackrf_transfer")
-    return p
-
-# ---------- bladeRF interactive wrapper ----------
-class BladeRFProc:
-    def __init__(self, cli_path, log_cb):
-        self.cli_path = cli_path
-        self.log = log_cb
-        self.proc = None
-        self.q = queue.Queue()
-
-    def start(self):
-        path = self.cli_path or find_bladerf_cli()
-        if not path or not os.path.isfile(path):
-            self.log("ERROR: bladeRF-cli not found (C:\\bladeRF, Program Files, or PATH)."); return False
-        flags = 0
-        if os.name == "nt" and hasattr(subprocess, "CREATE_NO_WINDOW"):
-            flags = subprocess.CREATE_NO_WINDOW
-        try:
-            self.proc = subprocess.Popen(
-                [path, "-i"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                universal_newlines=True, bufsize=1, creationflags=flags
-            )
-        except Exception as e:
-            self.log(f"ERROR launching bladeRF-cli: {e}"); return False
-        threading.Thread(target=self._reader, daemon=True).start()
-        return True
-
-    def _reader(self):
-        try:
-            for line in self.proc.stdout:
-                self.q.put(line.rstrip())
-        except Exception:
-            pass
-
-    def drain(self):
-        try:
-            while True: self.log(self.q.get_nowait())
-        except queue.Empty:
-            pass
-
-    def send(self, cmd, delay=0.02):
-        if not self.proc or not self.proc.stdin: return
-        self.proc.stdin.write(cmd.strip()+"\n"); self.proc.stdin.flush()
-        if delay>0: time.sleep(delay)
-
-    def stop(self):
-        try: self.send("tx stop", 0.02)
-        except: pass
-        try:
-            if self.proc and self.proc.stdin:
-                self.proc.stdin.write("quit\n"); self.proc.stdin.flush()
-        except: pass
-        try:
-            if self.proc: self.proc.wait(timeout=1.0)
-        except Exception:
-            pass
-
-# ---------- HackRF one-shot runner ----------
-class HackRFProc:
-    """
-    Thin wrapper around hackrf_transfer for TX from file.
-    """
-    def __init__(self, exe_path, log_cb):
-        self.exe_path = exe_path
-        self.log = log_cb
-        self.proc = None
-        self._reader_thread = None
-
-    def start_tx(self, filepath, freq_hz, samp_rate_hz, bb_bw_hz, tx_gain_db, repeat=False, bias_on=False):
-        path = self.exe_path or find_hackrf_transfer()
-        if not path or not os.path.isfile(path):
-            self.log("ERROR: hackrf_transfer not found (Program Files, C:\\hackrf, or PATH)."); return False
-
-        # Clamp gain to HackRF's VGA 0..47 dB
-        tx_gain_db = int(max(0, min(47, int(tx_gain_db))))
-
-        cmd = [
-            path,
-            "-t", filepath,
-            "-f", str(int(freq_hz)),
-            "-s", str(int(samp_rate_hz)),
-            "-x", str(tx_gain_db),
-            "-b", str(int(bb_bw_hz))
-        ]
-        if repeat:
-            cmd.append("-R")  # repeat indefinitely
-        if bias_on:
-            cmd.extend(["-a", "1"])  # antenna power ON
-
-        flags = 0
-        if os.name == "nt" and hasattr(subprocess, "CREATE_NO_WINDOW"):
-            flags = subprocess.CREATE_NO_WINDOW
-
-        try:
-            self.proc = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                universal_newlines=True, bufsize=1, creationflags=flags
-            )
-        except Exception as e:
-            self.log(f"ERROR launching hackrf_transfer: {e}"); return False
-
-        self._reader_thread = threading.Thread(target=self._reader, daemon=True)
-        self._reader_thread.start()
-        self.log("HackRF TX started.")
-        return True
-
-    def _reader(self):
-        try:
-            for line in self.proc.stdout:
-                self.log(line.rstrip())
-        except Exception:
-            pass
-        finally:
-            self.log("HackRF process ended.")
-
-    def stop(self):
-        if self.proc and self.proc.poll() is None:
-            try:
-                self.proc.terminate()
-                try:
-                    self.proc.wait(timeout=1.0)
-                except subprocess.TimeoutExpired:
-                    self.proc.kill()
-            except Exception:
-                pass
-        self.proc = None
-
-# ---- HackRF baseband filter quantizer ----
-def hackrf_quantize_bb_bw(fs_hz: int, req_bw_hz: int) -> int:
-    """
-    Snap requested BW to HackRF's allowed baseband filters.
-    Enforces minimum 1.75 MHz and caps by sample rate and ~device max (20 MHz typical).
-    """
-    allowed = [
-        1_750_000, 2_500_000, 3_500_000, 5_000_000, 5_500_000, 6_000_000,
-        7_000_000, 8_000_000, 9_000_000, 10_000_000, 12_000_000, 14_000_000,
-        15_000_000, 20_000_000
-    ]
-    cap = max(1_750_000, min(int(fs_hz), 20_000_000))
-    candidates = [v for v in allowed if v <= cap]
-    if not candidates:
-        return 1_750_000
-    target = max(1_750_000, int(req_bw_hz))
-    for v in candidates:
-        if v >= target:
-            return v
-    return candidates[-1]
-
 # ---------- Auto-scaled text rendering ----------
+# The font file is resolved once, fonts are cached by (path, size), the fitting size is a
+# binary search, and finished bitmaps are memoized, so a repeated Play renders nothing.
+TEXT_CACHE_BYTES = 64 << 20     # memoized text bitmaps (W*H bytes each), least recently used dropped
+_font_file = []                 # [resolved FONT_CANDIDATES entry], None meaning PIL's default font
+_fonts = {}                     # (path, px) -> font
+_text_cache = collections.OrderedDict()     # (text, w, h, pad) -> L image
+_text_lock = threading.Lock()
+
+def _font_path():
+    if not _font_file:
+        for f in FONT_CANDIDATES:
+            try: ImageFont.truetype(f, size=8)
+            except Exception: continue
+            _font_file.append(f); break
+        else:
+            _font_file.append(None)
+    return _font_file[0]
+
 def _load_font(px):
-    px = max(8, int(px))
-    for f in FONT_CANDIDATES:
-        try: return ImageFont.truetype(f, size=px)
-        except Exception: pass
-    return ImageFont.load_default()
+    key = (_font_path(), max(8, int(px)))
+    font = _fonts.get(key)
+    if font is None:
+        if len(_fonts) > 256: _fonts.clear()
+        font = _fonts[key] = ImageFont.truetype(key[0], size=key[1]) if key[0] else ImageFont.load_default()
+    return font
+
+def _fit_font(text, w, h, pad=6):
+    # Largest size in [8, 2h] whose bbox for text fits w x h less padding (the bbox grows with
+    # size, so a binary search: about log2(2h) measurements). Size 8 is used even if it overflows.
+    d = ImageDraw.Draw(Image.new("L", (1, 1), 0))
+    def measure(px):
+        font = _load_font(px); bbox = d.textbbox((0,0), text, font=font)
+        return font, bbox, bbox[2]-bbox[0]+2*pad <= w and bbox[3]-bbox[1]+2*pad <= h
+    lo, hi = 8, max(8, int(h*2))
+    font, bbox, fits = measure(lo)
+    while fits and lo < hi:
+        mid = (lo + hi + 1)//2
+        f, b, ok = measure(mid)
+        if ok: lo, font, bbox = mid, f, b
+        else: hi = mid - 1
+    return font, bbox
+
+def clear_text_caches():
+    """Forget fonts and memoized bitmaps (benchmarks, or after changing FONT_CANDIDATES)."""
+    with _text_lock: _text_cache.clear()
+    _fonts.clear(); _font_file.clear()
 
 def render_text_bitmap(text, w, h, pad=6):
-    test = Image.new("L", (w, h), 0); d = ImageDraw.Draw(test)
-    fs = int(h*2); font = _load_font(fs)
-    bbox = d.textbbox((0,0), text, font=font); tw, th = bbox[2]-bbox[0], bbox[3]-bbox[1]
-    while (tw+2*pad > w or th+2*pad > h) and fs > 8:
-        fs = max(8, int(fs*0.9)); font = _load_font(fs)
-        bbox = d.textbbox((0,0), text, font=font); tw, th = bbox[2]-bbox[0], bbox[3]-bbox[1]
+    """Text centred in a w x h L image at the largest size that fits; memoized, returns a copy."""
+    key = (text, w, h, pad)
+    with _text_lock:
+        img = _text_cache.get(key)
+        if img is not None:
+            _text_cache.move_to_end(key); return img.copy()
+    font, bbox = _fit_font(text, w, h, pad); tw, th = bbox[2]-bbox[0], bbox[3]-bbox[1]
     img = Image.new("L", (w, h), 0); d = ImageDraw.Draw(img)
     x = (w - tw)//2 - bbox[0]; y = (h - th)//2 - bbox[1]
     d.text((x, y), text, fill=255, font=font)
-    return img
+    if w*h <= TEXT_CACHE_BYTES:
+        with _text_lock:
+            _text_cache[key] = img
+            while sum(k[1]*k[2] for k in _text_cache) > TEXT_CACHE_BYTES: _text_cache.popitem(last=False)
+    return img.copy()
+
+# ---------- Raster preparation ----------
+# Large photos are reduced before anything else touches them: JPEG decodes straight to a
+# 1/2..1/8-scale luma plane (draft mode), other formats are box-reduced by an integer factor
+# inside resize, and colour is converted to gray only after that. NumPy (.npy) and headless
+# raw rasters (.gray 8-bit, .gray16 16-bit little-endian, size in the name: logo_640x480.gray16)
+# keep their full precision until the final resample. Prepared rasters are cached by file
+# content and target size, so a repeat Play decodes nothing.
+RASTER_CACHE_BYTES = 64 << 20   # prepared rasters kept in memory (W*H bytes each)
+RAW_RASTERS = {".gray": np.uint8, ".gray16": np.dtype("<u2")}
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)      # ITU-R 601, as PIL's convert("L")
+
+def _box_reduce(a, k):
+    # Mean over k x k blocks (ragged edge dropped), float32; trailing channel axis kept
+    H, W = a.shape[0]//k*k, a.shape[1]//k*k
+    return a[:H, :W].reshape(H//k, k, W//k, k, *a.shape[2:]).mean(axis=(1, 3), dtype=np.float32)
+
+def raster_from_array(a, w, h):
+    """
+    w x h L image from a 2-D (or H x W x channels) array: uint8 and uint16 use their full
+    range, floats 0..1, bool 0/1. Reduced at source precision, converted to 8 bits last.
+    """
+    a = np.asarray(a)
+    if a.ndim not in (2, 3) or a.size == 0: raise ValueError(f"raster must be 2-D or H x W x C, got shape {a.shape}")
+    if a.dtype == np.uint8: scale = 1.0
+    elif a.dtype == np.uint16: scale = 255.0 / 65535.0
+    elif a.dtype.kind in "fb": scale = 255.0
+    else: raise ValueError(f"unsupported raster dtype {a.dtype} (uint8, uint16, float or bool)")
+    if a.dtype.kind == "b": a = a.view(np.uint8)
+    k = max(1, min(a.shape[0] // (2*h), a.shape[1] // (2*w)))
+    f = _box_reduce(a, k) if k > 1 else a.astype(np.float32)
+    if f.ndim == 3:
+        f = f[..., :3] @ _LUMA[:f.shape[2]] if f.shape[2] >= 3 else f[..., 0]
+    f = np.asarray(Image.fromarray(np.ascontiguousarray(f * np.float32(scale)), "F").resize((w, h), Image.LANCZOS))
+    return Image.fromarray(np.clip(f + 0.5, 0, 255).astype(np.uint8), "L")
+
+def _raw_raster(path):
+    ext = os.path.splitext(path)[1].lower(); m = re.search(r"(\d+)x(\d+)", os.path.basename(path))
+    if not m: raise ValueError(f"{os.path.basename(path)}: raw raster needs its size in the name (e.g. logo_640x480{ext})")
+    W, H = int(m.group(1)), int(m.group(2)); dt = np.dtype(RAW_RASTERS[ext])
+    if os.path.getsize(path) != W*H*dt.itemsize:
+        raise ValueError(f"{os.path.basename(path)}: {os.path.getsize(path)} bytes, expected {W}x{H}x{dt.itemsize}")
+    return np.memmap(path, dtype=dt, mode="r", shape=(H, W))
+
+def decode_raster(path, w, h):
+    """w x h L image from an image file, .npy array or raw .gray/.gray16 raster (uncached)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy": return raster_from_array(np.load(path, mmap_mode="r"), w, h)
+    if ext in RAW_RASTERS: return raster_from_array(_raw_raster(path), w, h)
+    with Image.open(path) as im:
+        if im.format == "JPEG": im.draft("L", (w, h))   # decoder-side 1/2..1/8 scaling, luma only
+        if im.mode in ("I", "I;16", "I;16L", "I;16B"):    # 16-bit PNG/TIFF: keep the precision
+            return raster_from_array(np.clip(np.asarray(im), 0, 65535).astype(np.uint16), w, h)
+        if im.mode not in ("L", "RGB"): im = im.convert("L")
+        return im.resize((w, h), Image.LANCZOS, reducing_gap=2.0).convert("L")
+
+class RasterCache:
+    """
+    Prepared rasters by (file sha256, w, h), least recently used dropped past max_bytes.
+    Content hashes are remembered per (path, size, mtime), so a repeat load reads nothing.
+    """
+    def __init__(self, max_bytes=RASTER_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._imgs = collections.OrderedDict(); self._sums = {}
+        self._lock = threading.Lock()
+        self.hits = 0; self.misses = 0
+
+    def digest(self, path):
+        st = os.stat(path); k = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        d = self._sums.get(k)
+        if d is None:
+            h = hashlib.sha256()
+            with open(path, "rb") as f:
+                for b in iter(lambda: f.read(1 << 20), b""): h.update(b)
+            if len(self._sums) > 1024: self._sums.clear()
+            d = self._sums[k] = h.hexdigest()
+        return d
+
+    def get(self, key):
+        with self._lock:
+            img = self._imgs.get(key)
+            if img is None: self.misses += 1; return None
+            self._imgs.move_to_end(key); self.hits += 1
+            return img
+
+    def put(self, key, img):
+        with self._lock:
+            self._imgs[key] = img; used = sum(i.width*i.height for i in self._imgs.values())
+            while used > self.max_bytes and self._imgs:
+                old = self._imgs.popitem(last=False)[1]; used -= old.width*old.height
+
+    def stats(self):
+        return f"{self.hits} hits / {self.misses} misses"
+
+raster_cache = RasterCache()
+
+def load_image_raster(path, w, h, cache=None):
+    """w x h grayscale raster of path (see decode_raster), from cache when the file is unchanged."""
+    cache = cache or raster_cache
+    key = (cache.digest(path), w, h)
+    img = cache.get(key)
+    if img is None:
+        img = decode_raster(path, w, h); cache.put(key, img)
+    return img.copy()
+
+def prepare_raster(img, invert=False):
+    """Synthesis raster: optional amplitude inversion, then flipped so the top row goes first in time."""
+    if invert:  # invert colors (not orientation)
+        img = ImageOps.invert(img)
+    return ImageOps.flip(img)
+
+# ---------- Stage instrumentation ----------
+# Per-stage wall time, samples and (optionally) peak traced memory for one Play or render.
+# Totals accumulate across calls, so chunked loops report one line per stage. Stages must
+# not nest when memory is traced: each one resets the tracemalloc peak.
+STAGE_LOG   = "play_stages.jsonl"
+PROFILE_OUT = "play_profile.prof"
+
+class Stages:
+    def __init__(self, trace_mem=False):
+        self.stats = {}             # name -> [seconds, samples, peak bytes, calls], first-seen order
+        self.trace_mem = trace_mem
+        self._own_trace = trace_mem and not tracemalloc.is_tracing()
+        if self._own_trace: tracemalloc.start()
+        self.t0 = time.perf_counter(); self.wall = None
+
+    @contextlib.contextmanager
+    def __call__(self, name, samples=0):
+        if self.trace_mem:
+            tracemalloc.reset_peak(); base = tracemalloc.get_traced_memory()[0]
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            st = self.stats.setdefault(name, [0.0, 0, 0, 0])
+            st[0] += time.perf_counter() - t; st[1] += int(samples); st[3] += 1
+            if self.trace_mem: st[2] = max(st[2], tracemalloc.get_traced_memory()[1] - base)
+
+    def finish(self):
+        if self.wall is None: self.wall = time.perf_counter() - self.t0
+        if self._own_trace: tracemalloc.stop(); self._own_trace = False
+        return self
+
+    def table(self):
+        """Summary lines: per-stage ms, share of wall time, samples, MS/s and peak MiB."""
+        wall = self.wall or (time.perf_counter() - self.t0)
+        lines = [f"{'stage':12s} {'ms':>9s} {'%':>6s} {'samples':>11s} {'MS/s':>8s}"
+                 + (f" {'peak MiB':>9s}" if self.trace_mem else "")]
+        for name, (sec, n, peak, _) in self.stats.items():
+            rate = f"{n/sec/1e6:8.1f}" if n and sec > 0 else f"{'-':>8s}"
+            lines.append(f"{name:12s} {sec*1e3:9.1f} {100*sec/max(wall, 1e-9):5.1f}% {n or '-':>11} {rate}"
+                         + (f" {peak/2**20:9.1f}" if self.trace_mem else ""))
+        lines.append(f"{'wall':12s} {wall*1e3:9.1f} {100.0:5.1f}%")
+        return lines
+
+    def record(self, **meta):
+        """JSON-serializable dict of meta plus every stage."""
+        return dict(meta, time=time.strftime("%Y-%m-%dT%H:%M:%S"), wall_s=self.wall,
+                    stages={k: {"s": v[0], "samples": v[1], "peak_bytes": v[2] if self.trace_mem else None,
+                                "calls": v[3]} for k, v in self.stats.items()})
+
+class _NoStages:
+    def __call__(self, name, samples=0): return contextlib.nullcontext()
+
+NO_STAGES = _NoStages()
+
+def append_jsonl(path, rec):
+    with open(path, "a", encoding="utf-8") as f: f.write(json.dumps(rec) + "\n")
+
+def profile_report(prof, path=PROFILE_OUT, top=15):
+    """Dump a cProfile.Profile to path; returns the top cumulative-time lines as text."""
+    import io, pstats
+    prof.dump_stats(path)
+    out = io.StringIO()
+    pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(top)
+    return out.getvalue()
+
+# ---------- Cancellation + progress ----------
+# Long syntheses work in row groups (one block, or one round of pool tasks) and call
+# CancelToken.step() between groups. step() raises Cancelled once cancel() was called, so
+# a stop takes effect within one row group (about BLOCK_SAMPLES samples per worker), and
+# reports the fraction done and samples/s at most every PROGRESS_INTERVAL_S.
+PROGRESS_INTERVAL_S = 0.25
+
+class Cancelled(Exception):
+    """Raised at a row-group boundary after CancelToken.cancel()."""
+
+class CancelToken:
+    """Stop flag plus progress meter for one run; progress_cb(fraction, samples_per_s)."""
+    def __init__(self, progress_cb=None, interval=PROGRESS_INTERVAL_S):
+        self.ev = threading.Event()
+        self.cb = progress_cb; self.interval = interval
+        self.total = 0; self.done = 0               # samples expected / synthesized
+        self.t0 = time.perf_counter(); self._last = 0.0
+
+    def cancel(self): self.ev.set()
+
+    @property
+    def cancelled(self): return self.ev.is_set()
+
+    def check(self):
+        if self.ev.is_set(): raise Cancelled()
+
+    def expect(self, samples):
+        """Add samples to the work planned for this run (moves the 100% mark)."""
+        self.total += int(samples)
+
+    def step(self, samples=0):
+        """Count finished work; raises Cancelled if a stop was requested."""
+        self.check()
+        self.done += int(samples); now = time.perf_counter()
+        if self.cb and (now - self._last >= self.interval or self.done >= self.total > 0):
+            self._last = now
+            self.cb(min(1.0, self.done / self.total) if self.total else 0.0, self.done / max(now - self.t0, 1e-9))
+
+class _NoCancel:
+    cancelled = False
+    def check(self): pass
+    def expect(self, samples): pass
+    def step(self, samples=0): pass
+
+NO_CANCEL = _NoCancel()
 
 # ---------- IQ builders ----------
-def _row_worker(args):
-    idx, row, x_dst, ejphi = args
-    amp = np.interp(x_dst, np.arange(row.size, dtype=np.float32), row.astype(np.float32))
-    return idx, (amp * ejphi).astype(np.complex64)
+# Engine selection: the in-process NumPy engine wins on everything but huge rasters,
+# where spreading rows over a Pool can still beat a single core.
+MP_MIN_SAMPLES = 1 << 27        # H*Ns above which "auto" uses the shared-memory worker pool
+BLOCK_SAMPLES  = 1 << 22        # samples per vectorized row block (~32 MB float64 envelope)
+PEAK_SCALE     = 0.95           # normalize to ~95% FS
 
-def build_iq_mp(gray_img, fs_hz, bw_hz, rows_per_s, usb=True, fmin_hz=0.0):
-    if gray_img.mode != "L": gray_img = gray_img.convert("L")
-    data = np.asarray(gray_img, dtype=np.float32) / 255.0
-    H, W = data.shape
+def _resample_table(W, Ns):
+    """
+    Index/weight table mapping W pixels onto Ns samples. Reproduces np.interp on
+    the integer grid exactly: floor index plus float64 fractional offset.
+    """
+    x_dst = np.linspace(0, W-1, Ns, dtype=np.float32)
+    idx = np.minimum(x_dst.astype(np.intp), W-1)
+    frac = x_dst.astype(np.float64) - idx
+    return idx, frac
+
+def _synth_rows(rows, tpl, out):
+    """
+    Expand a (B x W) block of pixel rows into (B x Ns) chirp rows written to out:
+    a gather through the template's index table and a multiply-add, no searching.
+    Same arithmetic as np.interp per row (slope*dx + y0 in float64, complex128 product,
+    complex64 result), so output is bit-identical to the original per-row synthesis.
+    """
+    padded = np.empty((rows.shape[0], rows.shape[1]+1), dtype=np.float64)
+    padded[:, :-1] = rows; padded[:, -1] = rows[:, -1]
+    lo = padded[:, tpl.idx]
+    amp = padded[:, tpl.idx1]
+    amp -= lo; amp *= tpl.frac; amp += lo
+    np.multiply(amp, tpl.ejphi, out=out, casting="unsafe")
+    return out
+
+def _pick_engine(engine, H, Ns):
+    if engine != "auto": return engine
+    if H*Ns >= MP_MIN_SAMPLES and mp.cpu_count() > 2: return "mp"
+    return "numpy"
+
+def _chirp(fs_hz, bw_hz, rows_per_s, usb=True, fmin_hz=0.0, chirp="formula"):
+    if chirp == "nco": return _chirp_nco(fs_hz, bw_hz, rows_per_s, usb, fmin_hz)
     row_t = 1.0 / max(1e-6, rows_per_s)
     Ns = int(round(fs_hz * row_t)); Ns = max(16, Ns)
     t = np.linspace(0.0, row_t, Ns, endpoint=False, dtype=np.float32)
@@ -243,305 +363,1411 @@ def build_iq_mp(gray_img, fs_hz, bw_hz, rows_per_s, usb=True, fmin_hz=0.0):
         f0 = -bw_hz/2.0; k = float(bw_hz) / row_t
         phi = 2.0*np.pi*(f0*t + 0.5*k*t*t)
 
-    ejphi = np.exp(1j*phi).astype(np.complex64)
-    x_dst = np.linspace(0, W-1, Ns, dtype=np.float32)
-    tasks = [(r, data[r,:], x_dst, ejphi) for r in range(H)]
-    with mp.Pool(max(1, mp.cpu_count()-1)) as pool:
-        parts = pool.map(_row_worker, tasks)
-    parts.sort(key=lambda x: x[0])
-    iq = np.concatenate([p[1] for p in parts])
-
-    # DC block + normalize
-    iq -= np.mean(iq)
-    peak = float(np.max(np.abs(iq)) + 1e-9)
-    iq = (iq / peak * 0.95).astype(np.complex64)
-    return iq, H / float(rows_per_s)
-
-def save_sc16q11(path, iq):
-    i = np.clip(np.real(iq)*2047, -2048, 2047).astype(np.int16)
-    q = np.clip(np.imag(iq)*2047, -2048, 2047).astype(np.int16)
-    inter = np.empty(i.size*2, dtype=np.int16)
-    inter[0::2], inter[1::2] = i, q
-    with open(path, "wb") as f: inter.tofile(f)
-
-def save_sc8(path, iq):
-    # HackRF expects signed 8-bit interleaved I/Q
-    i = np.clip(np.real(iq)*127, -128, 127).astype(np.int8)
-    q = np.clip(np.imag(iq)*127, -128, 127).astype(np.int8)
-    inter = np.empty(i.size*2, dtype=np.int8)
-    inter[0::2], inter[1::2] = i, q
-    with open(path, "wb") as f: inter.tofile(f)
-
-# ---------- GUI ----------
-class App(tk.Tk):
-    def __init__(self):
-        super().__init__()
-        self.title("Spectrum Painter — bladeRF / HackRF — USB / Invert / Auto-scale / Dark")
-        self.configure(bg=CLR_BG)
-        self.geometry("1040x800")
-        self.protocol("WM_DELETE_WINDOW", self.on_close)
-
-        # Backends
-        self.cli = BladeRFProc(find_bladerf_cli(), self._log)
-        self.cli.start()
-        self.hackrf = HackRFProc(find_hackrf_transfer(), self._log)
-        self.after(150, self._poll_cli)
-
-        self.image_path = None
-        self.output_bin_sc16 = os.path.abspath("paint.bin")
-        self.output_bin_sc8  = os.path.abspath("paint_sc8.bin")
-
-        # Vars
-        self.mode     = tk.StringVar(value="text")
-        self.text_in  = tk.StringVar(value=DEFAULT_TEXT)
-        self.freq_mhz = tk.StringVar(value=str(DEFAULT_FREQ_MHZ))
-        self.sr_mhz   = tk.StringVar(value=str(DEFAULT_SR_MHZ))
-        self.bw_khz   = tk.StringVar(value=str(DEFAULT_BW_KHZ))
-        self.gain_db  = tk.StringVar(value=str(DEFAULT_GAIN_DB))
-        self.speed_rps= tk.StringVar(value=str(DEFAULT_SPEED))
-        self.r_w      = tk.StringVar(value=str(DEFAULT_W))
-        self.r_h      = tk.StringVar(value=str(DEFAULT_H))
-        self.repeat   = tk.BooleanVar(value=False)
-        self.usb_mode = tk.BooleanVar(value=DEFAULT_USB_MODE)
-        self.usb_fmin_khz = tk.StringVar(value="0")
-        self.invert   = tk.BooleanVar(value=False)
-        self.use_hackrf = tk.BooleanVar(value=False)  # backend selector
-
-        # Bias-T controls
-        self.bias_hackrf = tk.BooleanVar(value=False)
-        self.bias_bladerf_rx = tk.BooleanVar(value=False)
-        self.bias_bladerf_tx = tk.BooleanVar(value=False)
-
-        self._build_ui()
-
-    # ---- UI helpers ----
-    def _panel(self, parent):
-        return tk.Frame(parent, bg=CLR_PANEL, bd=1, highlightthickness=1, highlightbackground="#222833")
-    def _label(self, parent, txt):
-        return tk.Label(parent, text=txt, bg=CLR_PANEL, fg=CLR_MUTED)
-    def _entry(self, parent, var, w=10):
-        return tk.Entry(parent, textvariable=var, width=w, bg=CLR_EDIT, fg=CLR_EDIT_TXT,
-                        insertbackground=CLR_EDIT_TXT, relief="flat")
-    def _button(self, parent, txt, cmd, accent=False):
-        c = CLR_ACCENT if accent else CLR_BTN; fg = "#ffffff" if accent else CLR_TEXT
-        return tk.Button(parent, text=txt, command=cmd, bg=c, fg=fg,
-                         activebackground=CLR_BTN_H, activeforeground=fg, relief="flat", padx=10, pady=4)
-    def _check(self, parent, txt, var):
-        return tk.Checkbutton(parent, text=txt, variable=var, bg=CLR_PANEL, fg=CLR_TEXT,
-                              activebackground=CLR_PANEL, activeforeground=CLR_TEXT,
-                              selectcolor=CLR_BG, relief="flat")
-
-    # ---- Layout ----
-    def _build_ui(self):
-        bar = self._panel(self); bar.pack(fill="x", padx=10, pady=(10,6))
-        tk.Label(bar, text="Mode:", bg=CLR_PANEL, fg=CLR_TEXT).pack(side="left", padx=8, pady=8)
-        for val in ("image","text"):
-            tk.Radiobutton(bar, text=val.capitalize(), variable=self.mode, value=val,
-                           bg=CLR_PANEL, fg=CLR_TEXT, activebackground=CLR_PANEL,
-                           selectcolor=CLR_BG, command=self._toggle_mode).pack(side="left", padx=6)
-        self._check(bar, "Invert colors", self.invert).pack(side="left", padx=16)
-        self._check(bar, "Use HackRF (instead of bladeRF)", self.use_hackrf).pack(side="right", padx=10)
-
-        self.img_row = self._panel(self)
-        tk.Label(self.img_row, text="Image:", bg=CLR_PANEL, fg=CLR_MUTED).pack(side="left", padx=8, pady=8)
-        self.img_label = tk.Label(self.img_row, text="(none)", bg=CLR_PANEL, fg=CLR_MUTED)
-        self.img_label.pack(side="left", padx=6)
-        self._button(self.img_row, "Open…", self.pick_image).pack(side="left", padx=6)
-
-        self.txt_row = self._panel(self)
-        tk.Label(self.txt_row, text="Text:", bg=CLR_PANEL, fg=CLR_MUTED).pack(side="left", padx=8, pady=8)
-        tk.Entry(self.txt_row, textvariable=self.text_in, width=28,
-                 bg=CLR_EDIT, fg=CLR_EDIT_TXT, insertbackground=CLR_EDIT_TXT,
-                 relief="flat").pack(side="left", padx=6)
-        self.txt_row.pack(fill="x", padx=10, pady=6)
-
-        g1 = self._panel(self); g1.pack(fill="x", padx=10, pady=6)
-        for lbl, var in [("Freq (MHz)", self.freq_mhz),
-                         ("BW (kHz)", self.bw_khz),
-                         ("Power (dB)", self.gain_db),
-                         ("Sample-rate (MHz)", self.sr_mhz)]:
-            cell = tk.Frame(g1, bg=CLR_PANEL); cell.pack(side="left", padx=10, pady=8)
-            self._label(cell, lbl).pack(anchor="w")
-            self._entry(cell, var, 10).pack()
-
-        g2 = self._panel(self); g2.pack(fill="x", padx=10, pady=6)
-        for lbl, var in [("Speed (rows/s)", self.speed_rps),
-                         ("Raster W", self.r_w),
-                         ("Raster H", self.r_h)]:
-            cell = tk.Frame(g2, bg=CLR_PANEL); cell.pack(side="left", padx=10, pady=8)
-            self._label(cell, lbl).pack(anchor="w")
-            self._entry(cell, var, 10).pack()
-
-        g3 = self._panel(self); g3.pack(fill="x", padx=10, pady=6)
-        self._check(g3, "USB (single-sideband)", self.usb_mode).pack(side="left", padx=10, pady=10)
-        cell_usb = tk.Frame(g3, bg=CLR_PANEL); cell_usb.pack(side="left", padx=10, pady=8)
-        self._label(cell_usb, "USB fmin (kHz)").pack(anchor="w")
-        self._entry(cell_usb, self.usb_fmin_khz, 10).pack()
-        self._check(g3, "Repeat (loop)", self.repeat).pack(side="left", padx=20)
-
-        # Bias-T group
-        bias = self._panel(self); bias.pack(fill="x", padx=10, pady=6)
-        tk.Label(bias, text="Bias-T:", bg=CLR_PANEL, fg=CLR_TEXT).pack(side="left", padx=8, pady=8)
-        self._check(bias, "HackRF antenna power", self.bias_hackrf).pack(side="left", padx=10)
-        self._check(bias, "bladeRF RX bias-tee", self.bias_bladerf_rx).pack(side="left", padx=10)
-        self._check(bias, "bladeRF TX bias-tee", self.bias_bladerf_tx).pack(side="left", padx=10)
-
-        ctl = self._panel(self); ctl.pack(fill="x", padx=10, pady=6)
-        self._button(ctl, "Play", self.play, accent=True).pack(side="left", padx=8, pady=8)
-        self._button(ctl, "Stop", self.stop).pack(side="left", padx=8, pady=8)
-
-        lf = self._panel(self); lf.pack(fill="both", expand=True, padx=10, pady=(6,10))
-        self.log = tk.Text(lf, height=16, bg=CLR_EDIT, fg=CLR_TEXT,
-                           insertbackground=CLR_TEXT, relief="flat", wrap="word")
-        self.log.pack(fill="both", expand=True, padx=6, pady=6)
-        self.log.config(state=DISABLED)
-
-    def _toggle_mode(self):
-        if self.mode.get() == "image":
-            self.txt_row.forget(); self.img_row.pack(fill="x", padx=10, pady=6)
-        else:
-            self.img_row.forget(); self.txt_row.pack(fill="x", padx=10, pady=6)
-
-    # ---- Actions ----
-    def pick_image(self):
-        p = filedialog.askopenfilename(title="Select image",
-                                       filetypes=[("Images","*.png;*.jpg;*.jpeg;*.bmp")])
-        if not p: return
-        self.image_path = p
-        self.img_label.config(text=os.path.basename(p))
-        self._log(f"Image loaded: {p}")
+    return Ns, np.exp(1j*phi).astype(np.complex64)
 
-    def _poll_cli(self):
-        # Drain bladeRF interactive logs; HackRF logs stream directly in its own thread
-        self.cli.drain()
-        self.after(150, self._poll_cli)
+# ---- NCO chirp ----
+# The formula above builds t and t*t in float32, which loses phase at high rates and long
+# rows, and spends a transcendental np.exp per sample. The NCO steps a 64-bit integer phase
+# accumulator (phase word in 2^-64 cycles) by a linearly ramping frequency word, then looks
+# sine/cosine up in a table and corrects for the residual phase below the table step.
+CHIRP_KINDS   = ("formula", "nco")
+NCO_LUT_BITS  = 12
+_NCO_LUT = np.exp(2j*np.pi*np.arange(1 << NCO_LUT_BITS)/(1 << NCO_LUT_BITS)).astype(np.complex64)
 
-    def _log(self, msg):
-        self.log.config(state=NORMAL); self.log.insert(END, msg.rstrip()+"\n")
-        self.log.see(END); self.log.config(state=DISABLED)
+def _chirp_nco(fs_hz, bw_hz, rows_per_s, usb=True, fmin_hz=0.0):
+    row_t = 1.0 / max(1e-6, rows_per_s)
+    Ns = int(round(fs_hz * row_t)); Ns = max(16, Ns)
+    dt = row_t / Ns                                   # same sample grid as the formula's t
+    f0 = float(fmin_hz) if usb else -bw_hz/2.0; k = float(bw_hz) / row_t
+    # phase[n] = sum_{m<n} (f0*dt + k*dt^2*(m + 1/2)) = f0*t + k*t^2/2 at t = n*dt, in cycles
+    F0 = int(round((f0*dt + 0.5*k*dt*dt) * 2.0**64)) % (1 << 64)
+    K  = int(round(k*dt*dt * 2.0**64)) % (1 << 64)
+    freq = np.arange(Ns, dtype=np.uint64); freq *= np.uint64(K); freq += np.uint64(F0)
+    phase = np.empty(Ns, dtype=np.uint64); phase[0] = 0
+    np.cumsum(freq[:-1], out=phase[1:])               # wraps mod 2^64 == mod one cycle
+    shift = 64 - NCO_LUT_BITS
+    r = (phase & np.uint64((1 << shift) - 1)).astype(np.float32)
+    r *= np.float32(2.0*np.pi / 2.0**64)              # residual phase, < one table step (rad)
+    ejphi = np.empty(Ns, dtype=np.complex64)
+    ejphi.real = 1.0 - 0.5*r*r; ejphi.imag = r        # e^{jr} to second order
+    ejphi *= _NCO_LUT[(phase >> np.uint64(shift)).astype(np.intp)]
+    return Ns, ejphi
+
+# ---------- Chirp templates ----------
+# Chirp, resample table and DC fold vector depend only on (fs, bw, rows/s, usb, fmin, chirp, W),
+# so they are built once and shared by every raster (and every Play) with those settings.
+TEMPLATE_CACHE_MAX_BYTES = 256 << 20
+
+class ChirpTemplate:
+    """Read-only per-settings tables: complex chirp, pixel index/weight table, DC fold vector."""
+    def __init__(self, fs_hz, bw_hz, rows_per_s, usb, fmin_hz, chirp, W):
+        self.Ns, self.ejphi = _chirp(fs_hz, bw_hz, rows_per_s, usb, fmin_hz, chirp)
+        self.W = W
+        self.idx, self.frac = _resample_table(W, self.Ns)
+        self.idx1 = self.idx + 1
+        # fold[j] = sum of chirp samples weighted by pixel j's interpolation weight
+        hi = np.minimum(self.idx1, W-1)
+        e = self.ejphi.astype(np.complex128)
+        self.fold = (np.bincount(self.idx, (1.0-self.frac)*e.real, W)
+                     + np.bincount(hi, self.frac*e.real, W)
+                     + 1j*(np.bincount(self.idx, (1.0-self.frac)*e.imag, W)
+                           + np.bincount(hi, self.frac*e.imag, W)))
+        for a in (self.ejphi, self.idx, self.idx1, self.frac, self.fold): a.flags.writeable = False
+        self.nbytes = sum(a.nbytes for a in (self.ejphi, self.idx, self.idx1, self.frac, self.fold))
+
+class TemplateCache:
+    """LRU of ChirpTemplates bounded by total bytes."""
+    def __init__(self, max_bytes=TEMPLATE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._d = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0; self.misses = 0; self.evictions = 0
+
+    def get(self, fs_hz, bw_hz, rows_per_s, usb, fmin_hz, W, chirp="formula"):
+        key = (float(fs_hz), float(bw_hz), float(rows_per_s), bool(usb), float(fmin_hz) if usb else 0.0,
+               str(chirp), int(W))
+        with self._lock:
+            tpl = self._d.get(key)
+            if tpl is not None:
+                self._d.move_to_end(key); self.hits += 1
+                return tpl
+            self.misses += 1
+        tpl = ChirpTemplate(*key)
+        with self._lock:
+            if key not in self._d:
+                self._d[key] = tpl; self.nbytes += tpl.nbytes
+            while self.nbytes > self.max_bytes and len(self._d) > 1:
+                _, old = self._d.popitem(last=False)
+                self.nbytes -= old.nbytes; self.evictions += 1
+        return tpl
+
+    def clear(self):
+        with self._lock:
+            self._d.clear(); self.nbytes = 0
+
+    def stats(self):
+        return (f"{self.hits} hits / {self.misses} misses / {self.evictions} evictions, "
+                f"{len(self._d)} held ({self.nbytes/2**20:.1f} MB)")
+
+chirp_templates = TemplateCache()
+
+# ---------- Shared-memory worker pool ----------
+# One long-lived process pool per session. A RowSynth publishes its raster and chirp template
+# once as shared-memory blocks; workers attach by name and write rows straight into a shared
+# output buffer, returning only per-row peaks. No rows are pickled, sorted or concatenated.
+# The DC offset stays analytic (RowSynth.dc_offset), so workers need no partial sums.
+class SharedArray:
+    """
+    NumPy array .a in a shared-memory block; workers attach with .spec. release() drops
+    the name once workers are done; the mapping itself lives as long as .a or its views.
+    """
+    def __init__(self, shape, dtype, src=None):
+        dtype = np.dtype(dtype); shape = tuple(int(n) for n in shape)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+        self.a = np.ndarray(shape, dtype, buffer=self.shm.buf)
+        if src is not None: self.a[...] = src
+        self.spec = (self.shm.name, shape, dtype.str)
+        weakref.finalize(self.a, self.shm.close)
+        self._linked = True
+
+    def release(self):
+        if self._linked:
+            self._linked = False
+            try: self.shm.unlink()
+            except OSError: pass
+
+def _pool_task(args):
+    # Attach every shared block for one task, run fn(*arrays, *rest), detach
+    fn, specs, rest = args
+    shms = [shared_memory.SharedMemory(name=name) for name, _, _ in specs]
+    try:
+        return fn(*[np.ndarray(shape, dt, buffer=m.buf) for m, (_, shape, dt) in zip(shms, specs)], *rest)
+    finally:
+        for m in shms:
+            try: m.close()
+            except BufferError: pass    # an exception traceback still holds a view
+
+class _TplView:
+    def __init__(self, idx, idx1, frac, ejphi): self.idx, self.idx1, self.frac, self.ejphi = idx, idx1, frac, ejphi
+
+def _w_fill(data, idx, idx1, frac, ejphi, out, r0, r1, o0, dc, norm):
+    # Rows r0:r1 -> out[o0:...]; normalized in place if norm=(dc, peak), else per-row peaks about dc
+    blk = _synth_rows(data[r0:r1], _TplView(idx, idx1, frac, ejphi), out[o0:o0+r1-r0])
+    if norm: _normalize(blk, *norm); return None
+    return np.abs(blk - dc).max(axis=1)
+
+def _w_peaks(data, idx, idx1, frac, ejphi, r0, r1, dc):
+    # Per-row peaks about dc, synthesized into private scratch (same arithmetic as RowSynth.row_peaks)
+    blk = _synth_rows(data[r0:r1], _TplView(idx, idx1, frac, ejphi), np.empty((r1-r0, ejphi.size), np.complex64))
+    blk -= dc
+    return np.abs(blk).max(axis=1)
+
+def _w_normalize(out, r0, r1, dc, peak):
+    _normalize(out[r0:r1], dc, peak)
+
+def _w_ping(_):
+    return os.getpid()
+
+class WorkerPool:
+    """Session-wide process pool, started on first use or by warm() at startup."""
+    def __init__(self, processes=None):
+        self.processes = processes or max(1, mp.cpu_count()-1)
+        self._pool = None
+        self._lock = threading.Lock()
 
-    def play(self): threading.Thread(target=self._worker, daemon=True).start()
+    def start(self):
+        with self._lock:
+            if self._pool is None:
+                # Workers must share our resource tracker, or each one reports attached blocks as leaked
+                if os.name == "posix":
+                    from multiprocessing import resource_tracker
+                    resource_tracker.ensure_running()
+                self._pool = mp.Pool(self.processes)
+            return self._pool
+
+    def warm(self):
+        """Start every worker now so the first large Play does not pay process start-up."""
+        self.start().map(_w_ping, range(self.processes), chunksize=1)
+
+    def warm_async(self):
+        # Only where the "auto" engine can pick the pool at all
+        if mp.cpu_count() > 2: threading.Thread(target=self.warm, daemon=True).start()
+
+    def run(self, fn, specs, tasks, cancel=None, unit=0):
+        """
+        fn(*shared arrays, *task) for each task across the pool; results in task order.
+        With a CancelToken, tasks go out in rounds of two per worker and the token is
+        stepped by unit samples per task row, (r0, r1) being the first two task fields.
+        """
+        pool = self.start(); jobs = [(fn, specs, t) for t in tasks]
+        if cancel is None: return pool.map(_pool_task, jobs, chunksize=1)
+        out = []; k = 2 * self.processes
+        for i in range(0, len(jobs), k):
+            cancel.check()
+            out += pool.map(_pool_task, jobs[i:i+k], chunksize=1)
+            cancel.step(unit * sum(t[1] - t[0] for t in tasks[i:i+k]))
+        return out
+
+    def split(self, r0, r1, block_rows):
+        # Even share per worker, capped at block_rows rows per task
+        k = max(1, min(block_rows, -(-(r1-r0) // self.processes)))
+        return [(a, min(r1, a+k)) for a in range(r0, r1, k)]
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate(); self._pool.join(); self._pool = None
+
+worker_pool = WorkerPool()
+
+# ---------- Row synthesis ----------
+class RowSynth:
+    """
+    Everything needed to synthesize any row of one raster: pixel data plus the shared
+    chirp template. Rows can be produced in any order and block size, so the
+    full-array, streaming and pool paths all share the same arithmetic. With a
+    CancelToken, every row group steps it (and may raise Cancelled).
+    """
+    def __init__(self, gray_img, fs_hz, bw_hz, rows_per_s, usb=True, fmin_hz=0.0, chirp="formula", stages=None,
+                 engine="numpy", cancel=None):
+        if gray_img.mode != "L": gray_img = gray_img.convert("L")
+        self.data = np.asarray(gray_img, dtype=np.float32) / 255.0
+        self.H, self.W = self.data.shape
+        self.st = stages or NO_STAGES
+        with self.st("template"):
+            self.tpl = chirp_templates.get(fs_hz, bw_hz, rows_per_s, usb, fmin_hz, self.W, chirp)
+        self.Ns, self.ejphi = self.tpl.Ns, self.tpl.ejphi
+        self.block_rows = max(1, BLOCK_SAMPLES // self.Ns)
+        self.duration = self.H / float(rows_per_s)
+        self.pool = worker_pool if _pick_engine(engine, self.H, self.Ns) == "mp" else None
+        self.token = cancel                             # None: pool rounds need no checks
+        self.cancel = cancel or NO_CANCEL
+        self._pub = None
+
+    def publish(self):
+        """Shared-memory specs of raster + template for pool workers (created once)."""
+        if self._pub is None:
+            t = self.tpl
+            self._pub = [SharedArray(a.shape, a.dtype, a) for a in (self.data, t.idx, t.idx1, t.frac, t.ejphi)]
+        return [p.spec for p in self._pub]
+
+    def close(self):
+        for p in self._pub or (): p.release()
+        self._pub = None
+
+    def rows(self, r0, r1, out=None):
+        if out is None: out = np.empty((r1-r0, self.Ns), dtype=np.complex64)
+        self.cancel.check()
+        with self.st("synth", (r1-r0) * self.Ns):
+            self._synth(slice(r0, r1), out)
+        self.cancel.step((r1-r0) * self.Ns)
+        return out
+
+    def _synth(self, sel, out):
+        return _synth_rows(self.data[sel], self.tpl, out)
+
+    def blocks(self, block_rows=None):
+        B = block_rows or self.block_rows
+        for r0 in range(0, self.H, B):
+            yield r0, min(self.H, r0+B)
+
+    def dc_offset(self):
+        """
+        Mean of the un-normalized IQ without synthesizing it. Every sample is linear
+        in the pixels, so mean = (column sums) . (chirp folded onto the pixel grid) / (H*Ns).
+        Differs from np.mean over the finished float32 array by rounding only; the output
+        then moves by at most 2^-23 of full scale (selftest dc).
+        """
+        with self.st("dc_block"):
+            col = self.data.sum(axis=0, dtype=np.float64)
+            return np.complex64(np.dot(col, self.tpl.fold) / (self.H * self.Ns))
+
+    def rows_at(self, sel, out=None):
+        """Synthesize an arbitrary set of row indices."""
+        if out is None: out = np.empty((len(sel), self.Ns), dtype=np.complex64)
+        self.cancel.check()
+        self._synth(sel, out)
+        self.cancel.step(len(sel) * self.Ns)
+        return out
+
+    def row_peaks(self, dc, sel=None):
+        """Per-row max |x - dc| (all rows by default), one block at a time."""
+        if self.pool and sel is None:
+            with self.st("peak_scan", self.H * self.Ns):
+                parts = self.pool.run(_w_peaks, self.publish(),
+                                      [(r0, r1, dc) for r0, r1 in self.pool.split(0, self.H, self.block_rows)],
+                                      self.token, self.Ns)
+            return np.concatenate(parts)
+        sel = np.arange(self.H) if sel is None else np.asarray(sel)
+        out = np.empty(sel.size, dtype=np.float32)
+        with self.st("peak_scan", sel.size * self.Ns):
+            for i in range(0, sel.size, self.block_rows):
+                blk = self.rows_at(sel[i:i+self.block_rows]); blk -= dc
+                out[i:i+len(blk)] = np.abs(blk).max(axis=1)
+        return out
+
+    def peak(self, dc):
+        """Cheap first pass: max |x - dc| over all rows, synthesis only."""
+        return float(self.row_peaks(dc).max()) + 1e-9
+
+    def normalized(self, dc, peak, block_rows=None):
+        """
+        Yield DC-blocked, normalized (rows, Ns) blocks in row order. Each block is a
+        reused buffer, valid until the next one is requested. With the pool, workers
+        synthesize and normalize straight into a shared block buffer.
+        """
+        if not self.pool:
+            B = block_rows or self.block_rows
+            buf = np.empty((B, self.Ns), dtype=np.complex64)
+            for r0, r1 in self.blocks(B):
+                yield _normalize(self.rows(r0, r1, buf[:r1-r0]), dc, peak, self.st)
+            return
+        B = block_rows or self.block_rows * self.pool.processes
+        buf = SharedArray((B, self.Ns), np.complex64)
+        try:
+            for r0, r1 in self.blocks(B):
+                with self.st("pool_synth", (r1-r0) * self.Ns):
+                    self.pool.run(_w_fill, self.publish() + [buf.spec],
+                                  [(a, b, a-r0, dc, (dc, peak)) for a, b in self.pool.split(r0, r1, self.block_rows)],
+                                  self.token, self.Ns)
+                yield buf.a[:r1-r0]
+        finally:
+            buf.release()
+
+def _peak_of(iq, dc):
+    peak = 0.0
+    for s in range(0, iq.size, BLOCK_SAMPLES):
+        peak = max(peak, float(np.max(np.abs(iq[s:s+BLOCK_SAMPLES] - dc))))
+    return peak + 1e-9
+
+def _normalize(iq, dc, peak, stages=None):
+    # DC block + normalize, in place
+    st = stages or NO_STAGES
+    with st("dc_block", iq.size): iq -= dc
+    with st("normalize", iq.size): iq /= peak; iq *= PEAK_SCALE
+    return iq
+
+def build_iq_mp(gray_img, fs_hz, bw_hz, rows_per_s, usb=True, fmin_hz=0.0, engine="auto", chirp="formula",
+                stages=None, cancel=None):
+    s = RowSynth(gray_img, fs_hz, bw_hz, rows_per_s, usb, fmin_hz, chirp, stages, engine, cancel)
+    H, Ns = s.H, s.Ns
+    s.cancel.expect((2 if s.pool else 1) * H*Ns)
+    if s.pool:
+        # Workers write rows in place and return row peaks; a second round normalizes in place
+        out = SharedArray((H, Ns), np.complex64); dc = s.dc_offset()
+        try:
+            ranges = s.pool.split(0, H, s.block_rows)
+            with s.st("pool_synth", H*Ns):
+                peaks = s.pool.run(_w_fill, s.publish() + [out.spec], [(r0, r1, r0, dc, None) for r0, r1 in ranges],
+                                   cancel, Ns)
+            peak = float(max(p.max() for p in peaks)) + 1e-9
+            with s.st("normalize", H*Ns):
+                s.pool.run(_w_normalize, [out.spec], [(r0, r1, dc, peak) for r0, r1 in ranges], cancel, Ns)
+        finally:
+            out.release(); s.close()
+        return out.a.reshape(-1), s.duration
+    else:
+        iq = np.empty(H*Ns, dtype=np.complex64)
+        rows2d = iq.reshape(H, Ns)
+        for r0, r1 in s.blocks():
+            s.rows(r0, r1, rows2d[r0:r1])
+
+    dc = s.dc_offset()
+    with s.st("peak_scan", iq.size): peak = _peak_of(iq, dc)
+    _normalize(iq, dc, peak, s.st)
+    return iq, s.duration
+
+def iter_iq(gray_img, fs_hz, bw_hz, rows_per_s, usb=True, fmin_hz=0.0, chunk_rows=None, repeat=False,
+            chirp="formula", stages=None, engine="auto", cancel=None):
+    """
+    Yield the same normalized IQ as build_iq_mp as (chunk_rows*Ns,) complex64 chunks.
+    Peak memory depends on the chunk size, not on raster height. The DC offset is
+    computed analytically and the peak by a synthesis-only first pass. Each chunk
+    is a reused buffer, valid until the next one is requested. repeat=True loops
+    the raster forever (streaming TX). progress counts both passes over one repeat.
+    """
+    s = RowSynth(gray_img, fs_hz, bw_hz, rows_per_s, usb, fmin_hz, chirp, stages, engine, cancel)
+    yield from _iter_synth(s, chunk_rows, repeat)
+
+def _iter_synth(s, chunk_rows, repeat):
+    s.cancel.expect(2 * s.H * s.Ns)
+    try:
+        dc = s.dc_offset(); peak = s.peak(dc)
+        while True:
+            for blk in s.normalized(dc, peak, chunk_rows): yield blk.reshape(-1)
+            if not repeat: return
+    finally:
+        s.close()
+
+# ---------- Multi-band synthesis ----------
+# Several rasters painted side by side in one sample-rate span, e.g. a callsign next to a
+# logo. Each band has its own raster width, bandwidth and lower edge (negative: below the
+# carrier, USB-style chirp upwards); all bands share fs, rows/s and the raster height.
+# Every row block is synthesized band by band into one accumulator, so memory and the
+# DC/peak passes are those of a single raster and only the gather + multiply repeats per
+# band. Normalization sees the summed signal, i.e. the combined peak.
+BAND_BALANCE = ("none", "power")
+
+class Band:
+    """One sub-band: raster, bandwidth and lower edge in Hz, relative gain in dB."""
+    def __init__(self, img, bw_hz, fmin_hz, gain_db=0.0):
+        self.img = img if img.mode == "L" else img.convert("L")
+        self.bw_hz = float(bw_hz); self.fmin_hz = float(fmin_hz); self.gain_db = float(gain_db)
+
+    @property
+    def fmax_hz(self): return self.fmin_hz + self.bw_hz
+
+def check_bands(bands, fs_hz):
+    """ValueError unless every band has a positive width and lies within ±fs/2."""
+    if not bands: raise ValueError("no bands")
+    for b in bands:
+        if b.bw_hz <= 0 or b.fmin_hz < -fs_hz/2 or b.fmax_hz > fs_hz/2:
+            raise ValueError(f"band {b.fmin_hz/1e3:g}..{b.fmax_hz/1e3:g} kHz outside ±fs/2 = ±{fs_hz/2e3:g} kHz")
+
+def bands_span(bands):
+    """Two-sided bandwidth around the carrier that holds every band (for radio filters)."""
+    return 2.0 * max(max(abs(b.fmin_hz), abs(b.fmax_hz)) for b in bands)
+
+class MultiBandSynth(RowSynth):
+    """
+    RowSynth over several Bands summed per row; data is the band rasters side by side,
+    tpl/ejphi are band 0's.
+    balance="none" uses gain_db as an amplitude ratio; "power" first scales every band
+    to the same mean power (mean squared pixel), so a sparse callsign is not drowned by
+    a dense logo, then applies gain_db. In-process NumPy only (no pool).
+    """
+    def __init__(self, bands, fs_hz, rows_per_s, chirp="formula", stages=None, balance="none", cancel=None):
+        check_bands(bands, fs_hz)
+        if balance not in BAND_BALANCE: raise ValueError(f"unknown balance {balance!r}")
+        # Band 0 is the base RowSynth (tpl, ejphi, Ns, block size, cancel token); the other
+        # bands add their rasters and templates on the same row grid
+        b0 = bands[0]
+        super().__init__(b0.img, fs_hz, b0.bw_hz, rows_per_s, True, b0.fmin_hz, chirp, stages, "numpy", cancel)
+        px = [self.data] + [np.asarray(b.img, dtype=np.float32) / 255.0 for b in bands[1:]]
+        if any(p.shape[0] != self.H for p in px): raise ValueError("bands must share the raster height")
+        self.gains = []
+        for p, b in zip(px, bands):
+            g = 10.0 ** (b.gain_db / 20.0)
+            ms = float(np.mean(np.square(p, dtype=np.float64)))
+            if balance == "power" and ms > 0: g /= np.sqrt(ms)
+            self.gains.append(g)
+        with self.st("template"):
+            self.tpls = [self.tpl] + [chirp_templates.get(fs_hz, b.bw_hz, rows_per_s, True, b.fmin_hz,
+                                                          p.shape[1], chirp) for b, p in zip(bands[1:], px[1:])]
+        self.px = px
+        self.data = np.concatenate(px, axis=1); self.W = self.data.shape[1]
+        self._acc = None
+
+    def _synth(self, sel, out):
+        # Band 0 straight into out, the others through one reused scratch block. Gains scale
+        # the (rows x W) pixels, which interpolation carries linearly onto the samples.
+        for k, (p, tpl, g) in enumerate(zip(self.px, self.tpls, self.gains)):
+            rows = p[sel]
+            if g != 1.0: rows = rows * np.float32(g)
+            if k == 0:
+                _synth_rows(rows, tpl, out); continue
+            if self._acc is None or self._acc.shape[0] < out.shape[0]:
+                self._acc = np.empty(out.shape, dtype=np.complex64)
+            out += _synth_rows(rows, tpl, self._acc[:out.shape[0]])
+        return out
+
+    def dc_offset(self):
+        with self.st("dc_block"):
+            dc = sum(g * np.dot(p.sum(axis=0, dtype=np.float64), t.fold)
+                     for p, t, g in zip(self.px, self.tpls, self.gains))
+            return np.complex64(dc / (self.H * self.Ns))
+
+    def close(self):
+        super().close(); self._acc = None
+
+def iter_iq_bands(bands, fs_hz, rows_per_s, chirp="formula", balance="none", chunk_rows=None, repeat=False,
+                  stages=None, cancel=None):
+    """iter_iq for several Bands synthesized together; same chunking and normalization."""
+    s = MultiBandSynth(bands, fs_hz, rows_per_s, chirp, stages, balance, cancel)
+    yield from _iter_synth(s, chunk_rows, repeat)
+
+# ---------- Waterfall preview ----------
+# What an analyzer will show, predicted from the raster without synthesizing IQ. Within a
+# row the chirp visits f = f0 + BW*x/(W-1) when the envelope is at column x, so a bin's
+# power is the mean squared envelope over the columns it covers. No analyzer resolves a
+# chirp finer than about sqrt(BW*rows/s) (a window short enough to follow the sweep is
+# too short to separate nearby frequencies), so columns are blurred to that width. The DC
+# block leaves a tone of the file's mean at 0 Hz, estimated by stationary phase.
+PREVIEW_BINS  = 256             # frequency bins across the band plus margins
+PREVIEW_ROWS  = 256             # rows sampled evenly in time
+PREVIEW_FLOOR_DB = -50.0
+
+def chirp_resolution(bw_hz, rows_per_s):
+    """Finest frequency detail (Hz) an analyzer can show for this sweep rate."""
+    return float(np.sqrt(abs(bw_hz) * rows_per_s))
+
+def preview_waterfall(gray_img, fs_hz, bw_hz, rows_per_s, usb=True, fmin_hz=0.0, bins=PREVIEW_BINS,
+                      max_rows=PREVIEW_ROWS, margin=0.1):
+    """
+    Predicted waterfall for a prepared raster: (dB rows x bins relative to a full-white
+    pixel, in transmission order; bin centre frequencies in Hz at baseband).
+    """
+    if gray_img.mode != "L": gray_img = gray_img.convert("L")
+    data = np.asarray(gray_img, dtype=np.float32) / 255.0; H, W = data.shape
+    f0 = float(fmin_hz) if usb else -bw_hz/2.0
+    lo = max(-fs_hz/2.0, f0 - margin*bw_hz); hi = min(fs_hz/2.0, f0 + (1 + margin)*bw_hz)
+    edges = np.linspace(lo, hi, bins + 1); df = edges[1] - edges[0]
+    rows = data[np.linspace(0, H-1, min(H, max_rows)).round().astype(np.intp)].astype(np.float64)
+
+    # Running integral of envelope^2 at each pixel (exact for the linear interpolation between
+    # pixels that synthesis uses), read off at the bin edges
+    a0, a1 = rows[:, :-1], rows[:, 1:]
+    C = np.zeros((len(rows), max(2, W)))
+    if W > 1: np.cumsum((a0*a0 + a0*a1 + a1*a1) / 3.0, axis=1, out=C[:, 1:])
+    xe = np.clip((edges - f0) / bw_hz * (W-1), 0, W-1)
+    j = np.minimum(xe.astype(np.intp), C.shape[1]-2); fe = xe - j
+    Ce = C[:, j] * (1 - fe) + C[:, j+1] * fe
+    P = np.diff(Ce, axis=1) / (df / bw_hz * (W-1))
+
+    # Analyzer resolution: Gaussian blur across bins (FWHM = chirp_resolution)
+    sigma = chirp_resolution(bw_hz, rows_per_s) / 2.355 / df
+    if sigma > 0.3:
+        k = np.arange(bins); G = np.exp(-0.5 * ((k[:, None] - k[None, :]) / sigma)**2)
+        P = P @ (G / G.sum(axis=0, keepdims=True))
+
+    # DC-block tone: the file mean is the chirp's stationary point at 0 Hz, averaged over rows
+    x0 = (0.0 - f0) / bw_hz * (W-1)
+    if 0 <= x0 <= W-1 and lo <= 0 < hi:
+        j = min(int(x0), max(0, W-2)); f = x0 - j
+        a0 = float((data[:, j] * (1 - f) + data[:, min(j+1, W-1)] * f).mean())
+        dc = a0 * (0.5 if x0 in (0, W-1) else 1.0) / np.sqrt(bw_hz / rows_per_s)
+        P[:, min(bins-1, int((0 - lo) // df))] += dc*dc * bw_hz / df
+    db = 10*np.log10(np.maximum(P, 1e-12))
+    return np.maximum(db, PREVIEW_FLOOR_DB).astype(np.float32), 0.5*(edges[1:] + edges[:-1])
+
+def preview_image(db, size=None, floor=PREVIEW_FLOOR_DB):
+    """L image of a preview_waterfall, newest row on top like a scrolling waterfall."""
+    g = np.clip((db[::-1] - floor) / -floor, 0, 1)
+    img = Image.fromarray((g * 255 + 0.5).astype(np.uint8), "L")
+    return img.resize(size, Image.BILINEAR) if size else img
+
+# ---------- Quantize + write ----------
+# fmt -> (sample dtype, scale, clip lo, clip hi). The complex64 buffer is viewed as
+# interleaved float32 I/Q pairs, which is already the output layout, so quantizing is
+# scale + clip + cast over fixed-size slices through two small reusable buffers.
+IQ_FORMATS = {
+    "sc16q11": (np.int16, 2047, -2048, 2047),   # bladeRF
+    "sc8":     (np.int8,  127,  -128,  127),    # HackRF expects signed 8-bit interleaved I/Q; bladeRF SC8 Q7
+    "sc12p":   (np.int16, 2047, -2048, 2047),   # sc16q11 values packed on write, 3 bytes per I/Q pair
+}
+QUANT_CHUNK = 1 << 20           # floats (I or Q values) per quantize step
+
+def _as_pairs(iq):
+    # complex64 (N,) -> float32 (2N,) interleaved I/Q view, no copy for the usual case
+    return np.ascontiguousarray(iq, dtype=np.complex64).reshape(-1).view(np.float32)
+
+def quantize(iq, fmt, out=None, tmp=None):
+    """Interleaved integer I/Q for iq; same values as clip(x*scale).astype(dtype)."""
+    dtype, scale, lo, hi = IQ_FORMATS[fmt]
+    src = _as_pairs(iq)
+    if out is None: out = np.empty(src.size, dtype=dtype)
+    if tmp is None: tmp = np.empty(min(src.size, QUANT_CHUNK), dtype=np.float32)
+    for s in range(0, src.size, tmp.size):
+        n = min(tmp.size, src.size - s); t = tmp[:n]
+        np.multiply(src[s:s+n], scale, out=t)
+        np.clip(t, lo, hi, out=t)
+        out[s:s+n] = t
+    return out
+
+def quantize_sc16q11(iq): return quantize(iq, "sc16q11")
+def quantize_sc8(iq): return quantize(iq, "sc8")
+
+# ---------- Compact bladeRF formats ----------
+# SC16 Q11 spends 4 bytes on 24 bits of data. sc12p stores exactly those bits (I | Q << 12
+# as a little-endian 24-bit word, 3 bytes per sample) and is lossless against sc16q11;
+# sc8 (Q7, 2 bytes) gives up ~24 dB of quantization range. bladeRF-cli only reads
+# format=bin (SC16 Q11) files, so compact files are expanded on the fly while they are fed
+# to it through the FIFO; the disk and the IQ cache only ever see the compact bytes.
+SAMPLE_BYTES = {"sc16q11": 4, "sc8": 2, "sc12p": 3}
+FORMAT_DR_DB = {f: 20*np.log10(v[1]) for f, v in IQ_FORMATS.items()}  # full scale over one LSB
+BLADERF_FORMATS = ("sc8", "sc12p", "sc16q11")                       # smallest first
+DEFAULT_DR_DB = 60.0            # requested dynamic range for automatic bladeRF format choice
+DEFAULT_BLADERF_FORMAT = "sc16q11"  # bladeRF-cli reads it directly; compact formats and "auto" are opt-in
+
+def pick_format(dr_db=DEFAULT_DR_DB, compact=True):
+    """Smallest bladeRF file format whose quantization range covers dr_db (sc16q11 unless compact)."""
+    if not compact: return "sc16q11"
+    for f in BLADERF_FORMATS:
+        if FORMAT_DR_DB[f] >= dr_db: return f
+    return "sc12p"
+
+def pack12(q, out=None):
+    """Interleaved int16 I/Q (12-bit values) -> uint8, 3 bytes per I/Q pair."""
+    v = q.reshape(-1, 2); n = v.shape[0]
+    if out is None: out = np.empty(3 * n, dtype=np.uint8)
+    # Unaligned int16 views at byte 0 and 1 of every triple (see unpack12): I goes in whole,
+    # then byte 1 and 2 are overwritten with I's top nibble and Q shifted up by 4
+    lo = np.ndarray((n,), "<i2", out, 0, (3,)); hi = np.ndarray((n,), "<i2", out, 1, (3,))
+    lo[:] = v[:, 0]
+    t = np.left_shift(v[:, 1], 4); t |= (v[:, 0] >> 8) & 0x0F
+    hi[:] = t
+    return out
+
+def unpack12(b, out=None):
+    """Inverse of pack12: uint8 (3 bytes per pair) -> interleaved int16 I/Q, sign-extended."""
+    b = np.frombuffer(b, dtype=np.uint8); n = b.size // 3
+    if out is None: out = np.empty(2 * n, dtype=np.int16)
+    # Unaligned little-endian int16 views at byte 0 and 1 of every triple: I is the low 12
+    # bits of the first, Q the high 12 bits of the second (arithmetic shifts sign-extend)
+    lo = np.ndarray((n,), "<i2", b, 0, (3,)); hi = np.ndarray((n,), "<i2", b, 1, (3,))
+    I, Q = out.reshape(-1, 2)[:, 0], out.reshape(-1, 2)[:, 1]
+    np.left_shift(lo, 4, out=I); np.right_shift(I, 4, out=I)
+    np.right_shift(hi, 4, out=Q)
+    return out
+
+def pack(q, fmt, out=None):
+    """File bytes for quantized values q (only sc12p differs from the quantized array)."""
+    return pack12(q, out) if fmt == "sc12p" else q
+
+def to_sc16q11(b, fmt, out=None):
+    """Interleaved int16 SC16 Q11 from raw file bytes of fmt (sc8 Q7 is shifted up by 4 bits)."""
+    if fmt == "sc12p": return unpack12(b, out)
+    if fmt == "sc8":
+        q = np.frombuffer(b, dtype=np.int8)
+        if out is None: out = np.empty(q.size, dtype=np.int16)
+        np.left_shift(q, 4, out=out, dtype=np.int16); return out
+    return np.frombuffer(b, dtype=np.int16)
+
+class IQWriter:
+    """
+    Fused quantize-and-write into an open binary file: each QUANT_CHUNK slice is scaled,
+    clipped and cast into a preallocated integer buffer and written, so no full-size
+    temporaries exist whatever the size of the input or the number of chunks.
+    """
+    def __init__(self, f, fmt, chunk=QUANT_CHUNK, stages=None):
+        self.f = f; self.fmt = fmt; self.st = stages or NO_STAGES
+        self.tmp = np.empty(chunk, dtype=np.float32)
+        self.buf = np.empty(chunk, dtype=IQ_FORMATS[fmt][0])
+        self.packed = np.empty(chunk // 2 * SAMPLE_BYTES[fmt], dtype=np.uint8) if fmt == "sc12p" else None
+        self.samples = 0
+
+    def write(self, iq):
+        src = _as_pairs(iq)
+        for s in range(0, src.size, self.tmp.size):
+            n = min(self.tmp.size, src.size - s)
+            with self.st("quantize", n // 2):
+                out = quantize(src[s:s+n].view(np.complex64), self.fmt, self.buf[:n], self.tmp[:n])
+                if self.packed is not None: out = pack12(out, self.packed[:n // 2 * 3])
+            with self.st("write", n // 2):
+                self.f.write(out)
+        self.samples += src.size // 2
+        return src.size // 2
+
+def iq_file_bytes(n_samples, fmt):
+    return n_samples * SAMPLE_BYTES[fmt]
+
+def save_iq(path, iq, fmt):
+    with open(path, "wb") as f: IQWriter(f, fmt).write(iq)
+
+def save_iq_stream(path, chunks, fmt, stages=None):
+    """Append each IQ chunk to path as it arrives; returns samples written."""
+    with open(path, "wb") as f:
+        w = IQWriter(f, fmt, stages=stages)
+        for iq in chunks: w.write(iq)
+    return w.samples
+
+def save_sc16q11(path, iq): save_iq(path, iq, "sc16q11")
+def save_sc8(path, iq): save_iq(path, iq, "sc8")
+def save_sc16q11_stream(path, chunks): return save_iq_stream(path, chunks, "sc16q11")
+def save_sc8_stream(path, chunks): return save_iq_stream(path, chunks, "sc8")
+
+# ---------- IQ file cache ----------
+# Finished IQ files keyed by the final raster plus synthesis parameters. RF-only changes
+# (Fc, gain, bias-T, repeat) replay the cached file without synthesizing anything.
+IQ_CACHE_DIR       = os.path.abspath("iq_cache")
+IQ_CACHE_MAX_BYTES = 2 << 30
+IQ_CACHE_VERSION   = 1          # bump when synthesis output changes for the same inputs
+
+def iq_cache_key(gray_img, fs_hz, bw_hz, rows_per_s, usb, fmin_hz, fmt, chirp="formula"):
+    if gray_img.mode != "L": gray_img = gray_img.convert("L")
+    h = hashlib.sha256()
+    h.update(f"v{IQ_CACHE_VERSION}|{gray_img.width}x{gray_img.height}|{int(fs_hz)}|{int(bw_hz)}|"
+             f"{float(rows_per_s)!r}|{int(bool(usb))}|{float(fmin_hz)!r}|{fmt}|{chirp}|".encode())
+    h.update(gray_img.tobytes())
+    return h.hexdigest()
+
+def band_cache_key(bands, fs_hz, rows_per_s, fmt, chirp="formula", balance="none"):
+    h = hashlib.sha256()
+    h.update(f"v{IQ_CACHE_VERSION}|bands|{int(fs_hz)}|{float(rows_per_s)!r}|{fmt}|{chirp}|{balance}|".encode())
+    for b in bands:
+        h.update(f"{b.img.width}x{b.img.height}|{b.bw_hz!r}|{b.fmin_hz!r}|{b.gain_db!r}|".encode())
+        h.update(b.img.tobytes())
+    return h.hexdigest()
+
+class IQCache:
+    """
+    Directory of <key>.<fmt>.bin files with LRU eviction by mtime (touched on every hit).
+    Entries are added by hard link when possible, so caching a fresh paint.bin costs no copy.
+    """
+    def __init__(self, root=IQ_CACHE_DIR, max_bytes=IQ_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0; self.misses = 0
 
-    def stop(self):
-        if self.use_hackrf.get():
-            self.hackrf.stop()
-            self._log("HackRF TX stopped.")
-        else:
-            self.cli.send("tx stop", 0.02)
-            self._log("bladeRF TX stopped.")
+    def path(self, key, fmt):
+        return os.path.join(self.root, f"{key}.{fmt}.bin")
 
-    def on_close(self):
+    def get(self, key, fmt):
+        p = self.path(key, fmt)
+        try:
+            os.utime(p)
+        except OSError:
+            self.misses += 1; return None
+        self.hits += 1
+        return p
+
+    def put(self, key, fmt, src):
+        os.makedirs(self.root, exist_ok=True)
+        p = self.path(key, fmt); tmp = p + ".tmp"
         try:
-            self.hackrf.stop()
-        except: pass
+            if os.path.exists(tmp): os.remove(tmp)
+            try: os.link(src, tmp)
+            except OSError: shutil.copyfile(src, tmp)
+            os.replace(tmp, p)
+        except OSError:
+            return None
+        self.evict(keep=p)
+        return p
+
+    def drop(self, key, fmt):
+        try: os.remove(self.path(key, fmt))
+        except OSError: pass
+
+    def evict(self, keep=None):
         try:
-            self.cli.stop()
-        except: pass
-        self.destroy()
+            entries = [os.path.join(self.root, n) for n in os.listdir(self.root) if n.endswith(".bin")]
+            entries = [(os.stat(p), p) for p in entries]
+        except OSError:
+            return 0
+        total = sum(st.st_size for st, _ in entries); removed = 0
+        for st, p in sorted(entries, key=lambda e: e[0].st_mtime):
+            if total <= self.max_bytes: break
+            if p == keep: continue
+            try: os.remove(p)
+            except OSError: continue
+            total -= st.st_size; removed += 1
+        return removed
+
+    def stats(self):
+        return f"{self.hits} hits / {self.misses} misses"
+
+def unshare_file(path):
+    """Drop path if it is hard-linked into the cache, so rewriting it cannot clobber an entry."""
+    try:
+        if os.stat(path).st_nlink > 1: os.remove(path)
+    except OSError:
+        pass
+
+# ---------- Incremental re-synthesis ----------
+# Every row is exactly Ns samples at a fixed offset in the output file, so an edit that
+# touches a few rows only needs those rows re-synthesized and written through a memmap.
+PATCH_TOL_LSB = 0.25            # max drift of untouched rows, in output LSBs, before a full rebuild
+
+class IncrementalPainter:
+    """
+    Remembers the raster, parameters and normalization behind one output file and
+    patches only changed rows. Falls back to a full rebuild when the geometry changed
+    or the global DC/peak normalization would move untouched rows by more than
+    PATCH_TOL_LSB. A cancelled update that already touched the file removes it, since
+    it then matches neither the old raster nor the new one.
+    """
+    def __init__(self, path, fmt, log_cb, tol_lsb=PATCH_TOL_LSB, engine="auto"):
+        self.path = path
+        self.engine = engine
+        self.fmt = fmt
+        self.log = log_cb
+        self.tol_lsb = tol_lsb
+        self.key = None             # caller's tag for the current file content (e.g. cache key)
+        self._state = None
+        self._dirty = False         # file modified by the update in progress
+        self.exact = False          # file is byte-identical to a fresh render (safe to cache by content key)
+
+    def update(self, gray_img, fs_hz, bw_hz, rows_per_s, usb=True, fmin_hz=0.0, chirp="formula",
+               key=None, before_patch=None, stages=None, cancel=None):
+        """
+        Bring the output file up to date with gray_img; returns rows synthesized.
+        before_patch(prev_key) runs just before the file is modified in place.
+        """
+        s = RowSynth(gray_img, fs_hz, bw_hz, rows_per_s, usb, fmin_hz, chirp, stages, self.engine, cancel)
+        params = (int(fs_hz), int(bw_hz), float(rows_per_s), bool(usb), float(fmin_hz), chirp, s.W, s.H, s.Ns)
+        self._dirty = False
+        try:
+            reason = self._patch_blocker(s, params)
+            if reason is None:
+                n = self._patch(s, before_patch)
+                if n is not None:
+                    self.key = key; return n
+                reason = "normalization changed"
+            self.log(f"Full rebuild ({reason}).")
+            self._rebuild(s, params)
+            self.key = key
+            return s.H
+        except Cancelled:
+            if self._dirty:
+                self._state = None; self.key = None; self.exact = False
+                try: os.remove(self.path)
+                except OSError: pass
+            raise
+        finally:
+            s.close()
 
-    # ---- TX worker ----
-    def _worker(self):
+    def _patch_blocker(self, s, params):
+        st = self._state
+        if st is None: return "no previous raster"
+        if st["params"] != params: return "parameters changed"
+        nbytes = iq_file_bytes(s.H * s.Ns, self.fmt)
+        try:
+            if os.path.getsize(self.path) != nbytes: return "output file changed"
+        except OSError:
+            return "output file missing"
+        return None
+
+    def _patch(self, s, before_patch):
+        st = self._state
+        changed = np.flatnonzero(np.any(s.data != st["data"], axis=1))
+        if changed.size == 0:
+            self.log("Raster unchanged; output file is up to date."); return 0
+        lsb = PEAK_SCALE * IQ_FORMATS[self.fmt][1] / st["peak"]  # output LSBs per unit amplitude
+        dc = complex(s.dc_offset())
+        if abs(dc - complex(st["dc"])) * lsb > self.tol_lsb: return None
+        s.cancel.expect(2 * changed.size * s.Ns)
+        row_peaks = st["row_peaks"].copy()
+        row_peaks[changed] = s.row_peaks(st["dc"], changed)
+        peak = float(row_peaks.max()) + 1e-9
+        if abs(peak - st["peak"]) * lsb > self.tol_lsb: return None
+        # Within tolerance the old DC/peak are kept, so the file matches a fresh render only
+        # when both are exactly unchanged
+        exact = dc == complex(st["dc"]) and peak == st["peak"]
+
+        if before_patch: before_patch(self.key)
+        self._dirty = True; self.exact = False
+        mm = np.memmap(self.path, dtype=np.uint8, mode="r+", shape=(s.H, SAMPLE_BYTES[self.fmt]*s.Ns))
+        try:
+            for i in range(0, changed.size, s.block_rows):
+                sel = changed[i:i+s.block_rows]
+                with s.st("synth", len(sel) * s.Ns): blk = s.rows_at(sel)
+                _normalize(blk, st["dc"], st["peak"], s.st)
+                with s.st("quantize", blk.size):
+                    q = pack(quantize(blk, self.fmt), self.fmt).view(np.uint8).reshape(len(sel), -1)
+                with s.st("write", blk.size): mm[sel] = q
+            with s.st("write"): mm.flush()
+        finally:
+            del mm
+        st["data"] = s.data; st["row_peaks"] = row_peaks; self.exact = exact
+        self.log(f"Patched {changed.size}/{s.H} rows in place.")
+        return int(changed.size)
+
+    def _rebuild(self, s, params):
+        s.cancel.expect(2 * s.H * s.Ns)
+        dc = s.dc_offset(); row_peaks = s.row_peaks(dc)
+        peak = float(row_peaks.max()) + 1e-9
+        self._state = None; self._dirty = True; self.exact = False
+        unshare_file(self.path)
+        with open(self.path, "wb") as f:
+            w = IQWriter(f, self.fmt, stages=s.st)
+            for blk in s.normalized(dc, peak): w.write(blk)
+        self._state = {"params": params, "data": s.data, "dc": dc, "peak": peak, "row_peaks": row_peaks}
+        self.exact = True
+
+# ---------- Streaming TX ----------
+# Synthesis and the radio are decoupled by a small bounded queue of quantized chunks:
+# a full queue blocks synthesis (backpressure), an empty one starves the radio (underrun).
+STREAM_QUEUE_DEPTH = 8
+STREAM_CHUNK_S     = 0.25       # air time per streamed chunk; small chunks start RF sooner
+STREAM_FIFO = os.path.abspath("paint.fifo")
+
+class IQStreamer:
+    """
+    Feeds quantized IQ chunks to a consumer (hackrf_transfer stdin, a FIFO read by
+    bladeRF-cli, ...) from a writer thread, while later rows are still being synthesized.
+    """
+    def __init__(self, log_cb, depth=STREAM_QUEUE_DEPTH):
+        self.log = log_cb
+        self.q = queue.Queue(maxsize=depth)
+        self.bytes = 0; self.chunks = 0
+        self.underruns = 0; self.stalls = 0; self.stall_s = 0.0
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._unblock = None
+
+    def start(self, open_sink, unblock=None):
+        """open_sink() returns a binary writable; it may block (e.g. FIFO open) in the writer thread."""
+        self._unblock = unblock
+        self._t0 = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, args=(open_sink,), daemon=True)
+        self._thread.start()
+
+    def _run(self, open_sink):
+        f = None
         try:
-            fc   = int(float(self.freq_mhz.get()) * 1e6)
-            fs   = int(float(self.sr_mhz.get())   * 1e6)
-            bw   = int(float(self.bw_khz.get())   * 1e3)
-            g    = int(float(self.gain_db.get()))
-            sp   = float(self.speed_rps.get())
-            W    = int(self.r_w.get()); H = int(self.r_h.get())
-            usb  = bool(self.usb_mode.get())
-            fmin = float(self.usb_fmin_khz.get()) * 1e3
+            f = open_sink()
+            first = True
+            while not self._stop.is_set():
+                try:
+                    buf = self.q.get_nowait()
+                except queue.Empty:
+                    if not first: self.underruns += 1
+                    buf = self.q.get()
+                first = False
+                if buf is None: break
+                f.write(buf); self.bytes += buf.nbytes; self.chunks += 1
         except Exception as e:
-            self._log(f"Bad parameter: {e}"); return
-
-        # Nyquist safety for painter synthesis
-        if bw > int(0.9 * fs):
-            bw = int(0.9 * fs); self._log(f"Note: BW clamped to {bw/1e3:.1f} kHz for Nyquist.")
-
-        # Build raster
-        if self.mode.get() == "image":
-            if not self.image_path:
-                messagebox.showerror("Error", "Select an image first."); return
-            img = Image.open(self.image_path).convert("L").resize((W, H), Image.LANCZOS)
-        else:
-            txt = self.text_in.get().strip() or DEFAULT_TEXT
-            img = render_text_bitmap(txt, W, H)
-
-        if self.invert.get():  # invert colors (not orientation)
-            img = ImageOps.invert(img)
-
-        img = ImageOps.flip(img)  # top row first in time
-
-        self._log("Generating IQ (multiprocessing)…")
-        iq, dur = build_iq_mp(img, fs, bw, sp, usb=usb, fmin_hz=fmin if usb else 0.0)
-
-        if self.use_hackrf.get():
-            # HackRF path: write sc8, launch hackrf_transfer with quantized BB filter
-            out8 = self.output_bin_sc8
+            self.error = e
+        finally:
             try:
-                save_sc8(out8, iq)
-            except Exception as e:
-                self._log(f"ERROR writing BIN (sc8): {e}"); return
-            self._log(f"Wrote {out8}  (≈{dur:.2f} s)")
-
-            bb_bw = hackrf_quantize_bb_bw(fs, bw)
-            self._log(f"HackRF BB filter set to {bb_bw/1e6:.2f} MHz (requested {bw/1e3:.1f} kHz)")
-
-            started = self.hackrf.start_tx(
-                filepath=out8,
-                freq_hz=fc,
-                samp_rate_hz=fs,
-                bb_bw_hz=bb_bw,
-                tx_gain_db=g,
-                repeat=self.repeat.get(),
-                bias_on=self.bias_hackrf.get()
-            )
-            if not started:
-                self._log("Failed to start HackRF TX.")
-                return
-
-            if not self.repeat.get():
-                # Wait for the process to end (file streamed once)
-                while self.hackrf.proc and self.hackrf.proc.poll() is None:
-                    time.sleep(0.1)
-                self._log("TX complete (file finished).")
+                if f: f.close()
+            except Exception: pass
 
-        else:
-            # bladeRF path: write sc16q11 and drive CLI session
-            out = self.output_bin_sc16
-            try:
-                save_sc16q11(out, iq)
-            except Exception as e:
-                self._log(f"ERROR writing BIN (sc16q11): {e}"); return
-            self._log(f"Wrote {out}  (≈{dur:.2f} s)")
-
-            # Bias-T controls for bladeRF (errors will log if unsupported)
-            if self.bias_bladerf_rx.get():
-                self.cli.send("set biastee rx on", 0.02)
-            else:
-                self.cli.send("set biastee rx off", 0.02)
-            if self.bias_bladerf_tx.get():
-                self.cli.send("set biastee tx on", 0.02)
+    def put(self, buf):
+        """Queue one chunk, blocking while the consumer is behind. False once the stream is dead."""
+        try:
+            self.q.put_nowait(buf); return True
+        except queue.Full:
+            pass
+        self.stalls += 1; t = time.perf_counter()
+        try:
+            while not self._stop.is_set() and self.error is None and self._thread.is_alive():
+                try:
+                    self.q.put(buf, timeout=0.1); return True
+                except queue.Full:
+                    pass
+            return False
+        finally:
+            self.stall_s += time.perf_counter() - t
+
+    @property
+    def overruns(self):
+        # Synthesis got ahead of the radio and found the ring full (it then waits: nothing is dropped)
+        return self.stalls
+
+    def feed(self, chunks, fmt, stages=None):
+        """Quantize complex64 chunks into a ring of reused buffers and queue them; returns samples queued."""
+        st = stages or NO_STAGES; n = 0
+        # A slot is refilled only after the writer is done with it: the queue holds at most
+        # depth slots and the writer one more, so depth+2 slots never collide.
+        ring = [None] * (self.q.maxsize + 2); i = 0
+        for iq in chunks:
+            m = 2 * iq.size
+            if ring[i] is None or ring[i].size < m: ring[i] = np.empty(m, dtype=IQ_FORMATS[fmt][0])
+            with st("quantize", iq.size): buf = quantize(iq, fmt, ring[i][:m])
+            with st("queue", iq.size):
+                if not self.put(buf): break
+            n += iq.size; i = (i + 1) % len(ring)
+        return n
+
+    def feed_file(self, path, fmt, repeat=False, samples=1 << 18):
+        """Queue an IQ file of fmt as SC16 Q11 (compact formats expanded on the fly); returns samples queued."""
+        nb = SAMPLE_BYTES[fmt]; n = 0
+        ring = [np.empty(2 * samples, dtype=np.int16) for _ in range(self.q.maxsize + 2)]; i = 0
+        raw = ring[0].view(np.uint8) if fmt == "sc16q11" else np.empty(nb * samples, dtype=np.uint8)
+        while True:
+            with open(path, "rb") as f:
+                while not self._stop.is_set():
+                    if fmt == "sc16q11": raw = ring[i].view(np.uint8)
+                    k = f.readinto(raw) // nb
+                    if not k: break
+                    buf = to_sc16q11(raw[:k * nb], fmt, ring[i][:2 * k])
+                    if not self.put(buf): return n
+                    n += k; i = (i + 1) % len(ring)
+            if not repeat or self._stop.is_set() or n == 0: return n
+
+    def finish(self, timeout=None):
+        """Signal end of stream, wait for the writer to drain, and log the counters."""
+        if self._thread is None: return False
+        if self.error is None and not self._stop.is_set():
+            while self._thread.is_alive() and not self._stop.is_set():
+                try: self.q.put(None, timeout=0.1); break
+                except queue.Full: pass
+        self._thread.join(timeout)
+        dt = max(1e-9, time.perf_counter() - self._t0)
+        self.log(f"Stream: {self.bytes/1e6:.1f} MB in {self.chunks} chunks, {self.bytes/dt/1e6:.2f} MB/s, "
+                 f"underruns={self.underruns}, backpressure stalls={self.stalls} ({self.stall_s:.2f} s)")
+        if self.error is not None:
+            self.log(f"Stream ended early: {self.error}")
+        return self.error is None
+
+    def abort(self):
+        self._stop.set()
+        try:
+            while True: self.q.get_nowait()
+        except queue.Empty:
+            pass
+        try: self.q.put_nowait(None)
+        except queue.Full: pass
+        if self._unblock:
+            try: self._unblock()
+            except Exception: pass
+
+def make_fifo(path=STREAM_FIFO):
+    """Create a named pipe for bladeRF-cli to read from. None where FIFOs are unavailable (Windows)."""
+    if not hasattr(os, "mkfifo"): return None
+    try:
+        if os.path.exists(path): os.remove(path)
+        os.mkfifo(path)
+    except OSError:
+        return None
+    return path
+
+def unblock_fifo(path):
+    # A writer stuck in open() on a FIFO nobody reads is released by a throwaway reader
+    try: os.close(os.open(path, os.O_RDONLY | os.O_NONBLOCK))
+    except OSError: pass
+
+# ---------- Live ticker ----------
+# Text laid along the time axis: each transmitted row is one pixel column of the message
+# rendered horizontally at height W (glyph tops at the low-frequency edge), so it reads
+# bottom to top on a waterfall. Columns come from per-character strips rendered on demand,
+# and rows are synthesized just ahead of the radio into the streamer's ring, so memory does
+# not depend on message length or run time.
+TICKER_BLOCK_S = 0.1            # air time per synthesized block; with the ring, sets text-change latency
+TICKER_DEPTH   = 2              # blocks queued ahead of the radio
+TICKER_GAP     = "   "          # spacing between repeats of the message
+TICKER_DC_ALPHA = 0.05          # DC tracking per block (the message is unbounded, so no global mean)
+
+class TickerText:
+    """Endless raster rows (float32, 0..1, length W) for a message that can change at any time."""
+    def __init__(self, text, W, invert=False, pad=6):
+        self.W = W; self.invert = invert
+        # One font for the whole ticker, sized by line height so every glyph shares a baseline
+        self.font, bbox = _fit_font("HMgjy|", 1 << 20, W, pad)
+        self.y0 = (W - (bbox[3]-bbox[1]))//2 - bbox[1]
+        self._glyphs = {}           # char -> (W, advance) strip; bounded by the character set
+        self._lock = threading.Lock(); self._pending = None
+        self._start(text)
+
+    def _start(self, text):
+        self.text = text + TICKER_GAP; self._i = 0; self._col = 0
+
+    def set_text(self, text):
+        """New message, starting at the next row synthesized."""
+        with self._lock: self._pending = text
+
+    def _glyph(self, ch):
+        g = self._glyphs.get(ch)
+        if g is None:
+            if len(self._glyphs) > 1024: self._glyphs.clear()
+            adv = max(1, int(round(self.font.getlength(ch))))
+            img = Image.new("L", (adv, self.W), 0)
+            ImageDraw.Draw(img).text((0, self.y0), ch, fill=255, font=self.font)
+            g = np.asarray(img, dtype=np.float32) / 255.0
+            if self.invert: g = 1.0 - g
+            g = self._glyphs[ch] = np.ascontiguousarray(g.T)   # rows = columns of the glyph
+        return g
+
+    def rows(self, n, out=None):
+        if out is None: out = np.empty((n, self.W), dtype=np.float32)
+        with self._lock:
+            if self._pending is not None: self._start(self._pending); self._pending = None
+        k = 0
+        while k < n:
+            g = self._glyph(self.text[self._i])
+            take = min(n - k, g.shape[0] - self._col)
+            out[k:k+take] = g[self._col:self._col+take]
+            k += take; self._col += take
+            if self._col >= g.shape[0]: self._col = 0; self._i = (self._i + 1) % len(self.text)
+        return out
+
+def iter_ticker(ticker, fs_hz, bw_hz, rows_per_s, usb=True, fmin_hz=0.0, chirp="formula",
+                block_rows=None, stages=None):
+    """
+    Endless normalized IQ for a TickerText, one reused block at a time. The DC offset is
+    the analytic block mean, tracked slowly; scaling is fixed at the worst case so a full
+    white row never clips.
+    """
+    st = stages or NO_STAGES
+    with st("template"):
+        tpl = chirp_templates.get(fs_hz, bw_hz, rows_per_s, usb, fmin_hz, ticker.W, chirp)
+    B = block_rows or max(1, int(round(TICKER_BLOCK_S * rows_per_s)))
+    rows = np.empty((B, ticker.W), dtype=np.float32)
+    buf = np.empty((B, tpl.Ns), dtype=np.complex64); dc = None
+    while True:
+        with st("raster", B * ticker.W): ticker.rows(B, rows)
+        with st("synth", B * tpl.Ns): _synth_rows(rows, tpl, buf)
+        m = complex(np.dot(rows.sum(axis=0, dtype=np.float64), tpl.fold) / (B * tpl.Ns))
+        dc = m if dc is None else dc + TICKER_DC_ALPHA * (m - dc)
+        yield _normalize(buf, np.complex64(dc), 1.0 + abs(dc), st).reshape(-1)
+
+# ---------- Headless batch rendering ----------
+# A manifest is a JSON list of jobs (or {"jobs": [...]}, or one JSON object per line).
+# Job keys use the GUI's units; anything omitted takes the GUI default.
+JOB_DEFAULTS = {
+    "name": None, "text": None, "image": None, "out": None,
+    "w": DEFAULT_W, "h": DEFAULT_H, "sr_mhz": DEFAULT_SR_MHZ, "bw_khz": DEFAULT_BW_KHZ,
+    "speed": DEFAULT_SPEED, "usb": DEFAULT_USB_MODE, "fmin_khz": 0.0, "invert": False,
+    "format": "sc16q11", "chirp": "formula", "bands": None, "balance": "none",
+}
+# Keys of one entry in a job's "bands" list. Omitted w, bw_khz and invert come from the job;
+# an omitted fmin_khz puts the band right above the previous one (the first at the job's fmin_khz).
+BAND_DEFAULTS = {"text": None, "image": None, "w": None, "bw_khz": None, "fmin_khz": None, "gain_db": 0.0,
+                 "invert": None}
+
+def load_manifest(path, out_dir=None, defaults=None):
+    """Jobs with defaults filled in; image and output paths resolve relative to the manifest."""
+    with open(path, encoding="utf-8") as f: raw = f.read()
+    try:
+        doc = json.loads(raw)
+        # {"jobs": [...]}, a list of jobs, or one job object
+        jobs = (doc["jobs"] if "jobs" in doc else [doc]) if isinstance(doc, dict) else doc
+    except ValueError:
+        jobs = [json.loads(line) for line in raw.splitlines() if line.strip() and not line.lstrip().startswith("#")]
+    if not isinstance(jobs, list):
+        raise ValueError("manifest must be a job object, a list of jobs or {\"jobs\": [...]}")
+    base = os.path.dirname(os.path.abspath(path)); out_dir = out_dir or base
+    out = []
+    for n, j in enumerate(jobs):
+        if not isinstance(j, dict): raise ValueError(f"job {n}: expected an object, got {type(j).__name__}")
+        unknown = set(j) - set(JOB_DEFAULTS)
+        if unknown: raise ValueError(f"job {n}: unknown keys {sorted(unknown)}")
+        job = dict(JOB_DEFAULTS); job.update(defaults or {}); job.update(j)
+        if job["format"] not in IQ_FORMATS: raise ValueError(f"job {n}: unknown format {job['format']!r}")
+        if job["chirp"] not in CHIRP_KINDS: raise ValueError(f"job {n}: unknown chirp {job['chirp']!r}")
+        if job["balance"] not in BAND_BALANCE: raise ValueError(f"job {n}: unknown balance {job['balance']!r}")
+        if job["bands"] is not None:
+            if not isinstance(job["bands"], list) or not job["bands"]: raise ValueError(f"job {n}: empty bands")
+            bands = []
+            for k, b in enumerate(job["bands"]):
+                unknown = set(b) - set(BAND_DEFAULTS)
+                if unknown: raise ValueError(f"job {n} band {k}: unknown keys {sorted(unknown)}")
+                b = dict(BAND_DEFAULTS, **b)
+                if b["image"]: b["image"] = os.path.join(base, b["image"])
+                elif b["text"] is None: raise ValueError(f"job {n} band {k}: needs text or image")
+                bands.append(b)
+            job["bands"] = bands
+        if not job["image"] and job["text"] is None: job["text"] = DEFAULT_TEXT
+        if job["image"]: job["image"] = os.path.join(base, job["image"])
+        job["name"] = job["name"] or f"job{n:03d}"
+        job["out"] = os.path.join(out_dir, job["out"] or f"{job['name']}.{job['format']}.bin")
+        out.append(job)
+    return out
+
+def job_params(job):
+    """(fs, bw, rows/s, usb, fmin) in Hz for a manifest job, with the GUI's Nyquist clamp."""
+    fs = int(float(job["sr_mhz"]) * 1e6)
+    bw = min(int(float(job["bw_khz"]) * 1e3), int(0.9 * fs))
+    usb = bool(job["usb"])
+    return fs, bw, float(job["speed"]), usb, float(job["fmin_khz"]) * 1e3 if usb else 0.0
+
+def job_mem_bytes(job):
+    # Streaming render working set: one synthesis block (float64 gathers + complex64 rows),
+    # the chirp template, the raster and the quantize buffers.
+    fs, _, sp, _, _ = job_params(job)
+    Ns = max(16, int(round(fs / max(1e-6, sp)))); B = max(1, BLOCK_SAMPLES // Ns)
+    W, H = int(job["w"]), int(job["h"])
+    if job["bands"]:
+        # One accumulator block more, and a template per band
+        nb = len(job["bands"]); W = sum(int(b["w"] or W) for b in job["bands"])
+        return 40*B*Ns + 8*B*(W+nb) + 48*Ns*nb + 8*W*H + 6*QUANT_CHUNK + (32 << 20)
+    return 32*B*Ns + 8*B*(W+1) + 48*Ns + 8*W*H + 6*QUANT_CHUNK + (32 << 20)
+
+def available_memory():
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def job_raster(job):
+    """Final (inverted, flipped) raster for a manifest job."""
+    W, H = int(job["w"]), int(job["h"])
+    if job["image"]:
+        img = load_image_raster(job["image"], W, H)
+    else:
+        img = render_text_bitmap(str(job["text"]), W, H)
+    return prepare_raster(img, job["invert"])
+
+def job_bands(job):
+    """Bands of a multi-band job, rasters prepared at their width and the job's height."""
+    H = int(job["h"]); fs = int(float(job["sr_mhz"]) * 1e6)
+    out = []; edge = float(job["fmin_khz"]) * 1e3
+    for b in job["bands"]:
+        W = int(b["w"] or job["w"])
+        img = load_image_raster(b["image"], W, H) if b["image"] else render_text_bitmap(str(b["text"]), W, H)
+        invert = job["invert"] if b["invert"] is None else b["invert"]
+        bw = float(b["bw_khz"] if b["bw_khz"] is not None else job["bw_khz"]) * 1e3
+        fmin = edge if b["fmin_khz"] is None else float(b["fmin_khz"]) * 1e3
+        out.append(Band(prepare_raster(img, invert), min(bw, 0.9 * fs), fmin, b["gain_db"]))
+        edge = out[-1].fmax_hz
+    check_bands(out, fs)
+    return out
+
+def job_source(job, fmt=None, engine="auto", cancel=None):
+    """(IQ cache key, chunk iterator, occupied bandwidth in Hz) for a single- or multi-band job."""
+    fmt = fmt or job["format"]
+    fs, bw, sp, usb, fmin = job_params(job)
+    if job["bands"]:
+        bands = job_bands(job)
+        return (band_cache_key(bands, fs, sp, fmt, job["chirp"], job["balance"]),
+                iter_iq_bands(bands, fs, sp, job["chirp"], job["balance"], cancel=cancel), min(fs, bands_span(bands)))
+    img = job_raster(job)
+    return (iq_cache_key(img, fs, bw, sp, usb, fmin, fmt, job["chirp"]),
+            iter_iq(img, fs, bw, sp, usb, fmin, chirp=job["chirp"], engine=engine, cancel=cancel), bw)
+
+def render_job(job):
+    """Render one manifest job to its output file (runs in a pool worker). Returns a result dict."""
+    res = {"name": job["name"], "out": job["out"], "error": None}
+    t0 = time.perf_counter()
+    try:
+        _, _, sp, _, _ = job_params(job)
+        H = int(job["h"])
+        # Jobs already run in pool workers, which may not start pools of their own
+        _, chunks, _ = job_source(job, engine="numpy")
+        t1 = time.perf_counter()
+        os.makedirs(os.path.dirname(job["out"]) or ".", exist_ok=True)
+        n = save_iq_stream(job["out"], chunks, job["format"])
+        t2 = time.perf_counter()
+        res.update(samples=n, bytes=iq_file_bytes(n, job["format"]), duration=H / sp,
+                   t_raster=t1 - t0, t_synth=t2 - t1)
+    except Exception as e:
+        res["error"] = f"{type(e).__name__}: {e}"
+    res["t_total"] = time.perf_counter() - t0
+    return res
+
+def render_jobs(jobs, workers=None, mem_bytes=None, log=print):
+    """Render jobs across a process pool sized by CPU count and by memory; logs per-job timings."""
+    if not jobs: return []
+    need = max(job_mem_bytes(j) for j in jobs)
+    avail = mem_bytes or available_memory()
+    if workers is None:
+        workers = max(1, min(mp.cpu_count(), len(jobs)))
+        if avail: workers = max(1, min(workers, int(0.6 * avail // need)))
+    log(f"Rendering {len(jobs)} job(s) on {workers} worker(s) "
+        f"(≈{need/2**20:.0f} MiB each{f', {avail/2**30:.1f} GiB available' if avail else ''})")
+    t0 = time.perf_counter(); results = []
+    run = map if workers == 1 else None
+    pool = None if run else mp.Pool(workers)
+    try:
+        for r in (run(render_job, jobs) if run else pool.imap_unordered(render_job, jobs)):
+            results.append(r)
+            if r["error"]:
+                log(f"  {r['name']}: FAILED {r['error']}")
             else:
-                self.cli.send("set biastee tx off", 0.02)
-
-            cmds = [
-                f"set samplerate tx {fs}",
-                f"set frequency tx {fc}",
-                f"set bandwidth tx {bw}",
-                f"set gain tx {g}",
-                f"tx config file=\"{out}\" format=bin repeat={'0' if self.repeat.get() else '1'}",
-                "tx start"
-            ]
-            for c in cmds: self.cli.send(c, 0.02)
-            self._log("TX started.")
-
-            if not self.repeat.get():
-                self.cli.send("tx wait", 0.05)
-                self.cli.send("tx stop", 0.02)
-                self._log("TX complete (file finished).")
+                log(f"  {r['name']}: {r['out']}  {r['bytes']/1e6:.1f} MB, {r['duration']:.1f} s on air  "
+                    f"raster {r['t_raster']*1e3:.0f} ms, synth+write {r['t_synth']:.2f} s "
+                    f"({r['samples']/max(r['t_synth'], 1e-9)/1e6:.1f} MS/s)")
+    finally:
+        if pool: pool.close(); pool.join()
+    wall = time.perf_counter() - t0
+    ok = [r for r in results if not r["error"]]
+    n = sum(r["samples"] for r in ok); nb = sum(r["bytes"] for r in ok)
+    log(f"Done: {len(ok)}/{len(results)} ok in {wall:.2f} s  —  {n/1e6:.1f} MS, {nb/1e6:.1f} MB, "
+        f"{n/max(wall, 1e-9)/1e6:.1f} MS/s, {nb/max(wall, 1e-9)/1e6:.1f} MB/s aggregate")
+    return results
+
+# ---------- Playlist ----------
+# Items are manifest jobs played back to back. While item k is on air, a background thread
+# prepares item k+1 (IQ cache hit or synthesis into the cache), so the radio waits for
+# synthesis only when an item renders slower than its predecessor transmits.
+PLAYLIST_AHEAD = 1              # items prepared ahead of the one on air (double buffering)
+
+class TxMark:
+    """Set once, with the perf_counter time, when an item goes on or off air."""
+    def __init__(self):
+        self.ev = threading.Event(); self.t = None
+
+    def set(self, t=None):
+        self.t = time.perf_counter() if t is None else t; self.ev.set()
+
+def prepare_item(job, cache, fmt=None, cancel=None):
+    """IQ file for one playlist job through the cache; returns an item dict."""
+    t0 = time.perf_counter()
+    fmt = fmt or job["format"]
+    fs, _, sp, _, _ = job_params(job)
+    key, chunks, bw = job_source(job, fmt, cancel=cancel)
+    path = cache.get(key, fmt); hit = path is not None
+    if not hit:
+        os.makedirs(cache.root, exist_ok=True)
+        part = f"{cache.path(key, fmt)}.{os.getpid()}.part"
+        try:
+            save_iq_stream(part, chunks, fmt)
+        except BaseException:
+            try: os.remove(part)
+            except OSError: pass
+            raise
+        path = cache.put(key, fmt, part)
+        if path: os.remove(part)
+        else: path = part           # cache unavailable: play the rendered file directly
+    return {"name": job["name"], "job": job, "path": path, "key": key, "fmt": fmt, "hit": hit,
+            "fs": fs, "bw": bw, "duration": int(job["h"]) / sp, "prep_s": time.perf_counter() - t0}
+
+class PlaylistRunner:
+    """
+    Double-buffered playback. prepare(job) -> item runs on a background thread at most
+    `ahead` items in front; queue_tx(item) -> (on, off) TxMarks hands an item to the radio
+    without waiting for it to play. At most the item on air plus the next one are queued
+    on the radio. The gap between consecutive items (next on - previous off) is logged.
+    timed=False is for radios whose marks are set on queueing rather than on air: each
+    item is then given its air time before the next is queued, and gaps are not measured.
+    """
+    def __init__(self, jobs, prepare, queue_tx, log_cb, loop=False, ahead=PLAYLIST_AHEAD, timed=True):
+        self.jobs = list(jobs); self.prepare = prepare; self.queue_tx = queue_tx
+        self.log = log_cb; self.loop = loop; self.timed = timed
+        self.q = queue.Queue(maxsize=max(1, ahead))
+        self._stop = threading.Event()
+        self.played = 0; self.gaps = []; self.prep_s = 0.0
+
+    def stop(self):
+        self._stop.set()
+
+    def _producer(self):
+        try:
+            while not self._stop.is_set():
+                for job in self.jobs:
+                    try:
+                        item = self.prepare(job)
+                    except Cancelled:
+                        return
+                    except Exception as e:
+                        self.log(f"Playlist: {job['name']}: FAILED {type(e).__name__}: {e}"); continue
+                    while not self._stop.is_set():
+                        try: self.q.put(item, timeout=0.1); break
+                        except queue.Full: pass
+                    if self._stop.is_set(): return
+                if not self.loop: break
+        finally:
+            while True:
+                try: self.q.put(None, timeout=0.1); break
+                except queue.Full:
+                    if self._stop.is_set(): break
+
+    def _wait(self, mark, timeout):
+        # Wait for a mark, giving up on stop or after timeout seconds; returns its time or None
+        end = time.perf_counter() + timeout
+        while not self._stop.is_set() and time.perf_counter() < end:
+            if mark.ev.wait(0.1): return mark.t
+        return mark.t
+
+    def _report(self, prev, cur):
+        item, on, _ = cur
+        t_on = self._wait(on, 30.0)
+        how = "cache hit" if item["hit"] else f"synthesized in {item['prep_s']:.2f} s"
+        if t_on is None: return
+        if prev is None or prev[2].t is None:
+            self.log(f"Playlist: {item['name']} on air ({how})"); return
+        t_off = prev[2].t
+        gap = t_on - t_off; self.gaps.append(gap)
+        self.log(f"Playlist: {item['name']} on air, gap {gap*1e3:.0f} ms after {prev[0]['name']} ({how})")
+
+    def run(self):
+        """Play every item (forever with loop=True) until stop(); returns items played."""
+        threading.Thread(target=self._producer, daemon=True).start()
+        pending = collections.deque()   # (item, on, off) queued on the radio, oldest first
+        while not self._stop.is_set():
+            try: item = self.q.get(timeout=0.1)
+            except queue.Empty: continue
+            if item is None: break
+            if pending: self.prep_s += item["prep_s"]     # prepared while another item was on air
+            marks = self.queue_tx(item)
+            if marks is None:
+                self.log(f"Playlist: ERROR could not queue {item['name']} (radio not running); stopping."); break
+            if not self.timed:
+                # No on-air marks to wait for: hold the next item back for this one's air time
+                self.log(f"Playlist: {item['name']} queued (untimed)")
+                self._stop.wait(item["duration"])
+                if not self._stop.is_set(): self.played += 1
+                continue
+            pending.append((item,) + tuple(marks))
+            if len(pending) == 1:
+                self._report(None, pending[0]); continue
+            # The next item is queued behind the one on air: wait for the hand-over
+            prev = pending.popleft()
+            self._wait(prev[2], prev[0]["duration"] * 2 + 30.0)
+            self._report(prev, pending[0])
+            if prev[2].t is not None: self.played += 1
+        for item, _, off in pending:
+            if self._wait(off, item["duration"] * 2 + 30.0) is not None: self.played += 1
+        self._stop.set()
+        if self.gaps:
+            self.log(f"Playlist: {self.played} item(s), gaps mean {1e3*sum(self.gaps)/len(self.gaps):.0f} ms, "
+                     f"max {1e3*max(self.gaps):.0f} ms; {self.prep_s:.2f} s of preparation overlapped with TX")
+        return self.played
 
 # ---------- Main ----------
-if __name__ == "__main__":
-    mp.freeze_support()
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Spectrum painter for bladeRF / HackRF. Without a command, starts the GUI.")
+    sub = ap.add_subparsers(dest="cmd")
+    p = sub.add_parser("render", help="render a job manifest to IQ files without the GUI or a radio")
+    p.add_argument("manifest", help="JSON list of jobs, {\"jobs\": [...]}, or JSON lines")
+    p.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: by CPUs and memory)")
+    p.add_argument("-o", "--out-dir", default=None, help="directory for relative outputs (default: manifest's)")
+    p.add_argument("--mem-gb", type=float, default=None, help="memory budget for sizing the pool")
+    p = sub.add_parser("selftest", help="run built-in checks against local stand-in processes (no radio)")
+    p.add_argument("names", nargs="*", help="checks to run (default: all; listed in tests/selftests.py)")
+    p = sub.add_parser("bench", help="time text/image/synthesis/write stages; compare against a stored baseline")
+    p.add_argument("--quick", action="store_true", help="smaller grid")
+    p.add_argument("--repeat", type=int, default=3, help="runs per case, best time kept")
+    p.add_argument("--filter", default=None, help="only cases whose name contains this")
+    p.add_argument("--out", default=None, help="write results JSON here")
+    p.add_argument("--baseline", default=None, help="baseline JSON; exit 1 on regression")
+    p.add_argument("--threshold", type=float, default=0.25, help="allowed regression fraction (default 0.25)")
+    p.add_argument("--update-baseline", action="store_true", help="store this run as the baseline")
+    args = ap.parse_args(argv)
+    if args.cmd == "bench":
+        if args.update_baseline and not args.baseline: ap.error("--update-baseline needs --baseline FILE")
+        import sdrpainter_bench
+        return sdrpainter_bench.main(args)
+    if args.cmd == "render":
+        try:
+            jobs = load_manifest(args.manifest, args.out_dir)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            ap.error(f"bad manifest: {e}")
+        results = render_jobs(jobs, args.jobs, args.mem_gb and int(args.mem_gb * 2**30))
+        return 1 if any(r["error"] for r in results) else 0
+    if args.cmd == "selftest":
+        from tests.selftests import SELFTESTS, run_selftests
+        unknown = [n for n in args.names if n not in SELFTESTS]
+        if unknown: ap.error(f"unknown selftest: {', '.join(unknown)}")
+        return run_selftests(args.names)
+    from sdrpainter_gui import App
     app = App()
     app.mainloop()
+    return 0
+
+if __name__ == "__main__":
+    mp.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# Synthesis and I/O benchmarks for sdrpainter. Run with: python sdrpainter.py bench
+# Headless, no radio. Results are JSON; a stored baseline turns the run into a regression gate.
+
+import os, sys, time, json, platform, tempfile, tracemalloc
+import numpy as np
+from PIL import Image
+
+import sdrpainter as sp
+
+BENCH_THRESHOLD = 0.25          # allowed slowdown / memory growth vs baseline (fraction)
+BENCH_SLACK_S   = 0.005         # ignore wall-time regressions smaller than this (timer noise)
+
+# Grid for build_iq_mp: raster sizes x sample rates x speeds
+BENCH_RASTERS = [(256, 64), (1024, 128)]
+BENCH_RATES   = [2_000_000, 8_000_000]
+BENCH_SPEEDS  = [30.0, 120.0]
+BENCH_BW      = 100_000
+
+def _measure(fn, repeat):
+    # Best-of-N wall time untraced, then one traced run for peak memory (NumPy buffers included)
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        t = time.perf_counter(); fn(); best = min(best, time.perf_counter() - t)
+    tracemalloc.start()
+    try:
+        fn(); peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+def bench_cases(tmp, quick=False):
+    """(name, samples processed, callable) for every case."""
+    rasters = BENCH_RASTERS[:1] if quick else BENCH_RASTERS
+    rates = BENCH_RATES[:1] if quick else BENCH_RATES
+    speeds = BENCH_SPEEDS[:1] if quick else BENCH_SPEEDS
+
+    def cold_text(t, w, h):
+        sp.clear_text_caches(); return sp.render_text_bitmap(t, w, h)
+    for text, (w, h) in [("HELLO", (1024, 512)), ("CQ CQ DE N0CALL N0CALL K", (2048, 256))]:
+        yield f"text/{len(text)}ch/{w}x{h}", w*h, lambda t=text, w=w, h=h: cold_text(t, w, h)
+        yield f"text/{len(text)}ch/{w}x{h}/memoized", w*h, lambda t=text, w=w, h=h: sp.render_text_bitmap(t, w, h)
+
+    src = os.path.join(tmp, "photo.jpg")
+    rng = np.random.default_rng(0)
+    big = (4000, 3000) if not quick else (2000, 1500)
+    Image.fromarray(rng.integers(0, 256, (big[1], big[0], 3), dtype=np.uint8)).save(src, quality=90)
+    for w, h in rasters:
+        yield (f"image/{big[0]}x{big[1]}->{w}x{h}", big[0]*big[1],
+               lambda w=w, h=h: sp.load_image_raster(src, w, h, sp.RasterCache()))
+        sp.load_image_raster(src, w, h)  # fill the shared cache so every timed run is a hit
+        yield f"image/{big[0]}x{big[1]}->{w}x{h}/cached", big[0]*big[1], lambda w=w, h=h: sp.load_image_raster(src, w, h)
+    raw = os.path.join(tmp, f"scan_{big[0]}x{big[1]}.gray16")
+    rng.integers(0, 65536, (big[1], big[0]), dtype=np.uint16).astype("<u2").tofile(raw)
+    for w, h in rasters:
+        yield (f"image/raw16/{big[0]}x{big[1]}->{w}x{h}", big[0]*big[1],
+               lambda w=w, h=h: sp.load_image_raster(raw, w, h, sp.RasterCache()))
+
+    for w, h in rasters:
+        img = sp.prepare_raster(sp.render_text_bitmap("HELLO", w, h))
+        for fs in rates:
+            for speed in speeds:
+                n = h * max(16, int(round(fs / speed)))
+                for chirp in sp.CHIRP_KINDS:
+                    yield (f"build/{w}x{h}/{fs/1e6:g}MHz/{speed:g}rps/{chirp}", n,
+                           lambda img=img, fs=fs, speed=speed, chirp=chirp:
+                               sp.build_iq_mp(img, fs, BENCH_BW, speed, engine="numpy", chirp=chirp))
+
+    def drain(chunks):
+        for _ in chunks: pass
+    for w, h in rasters:
+        # Two bands side by side (callsign + logo), one pass into a shared accumulator
+        bands = [sp.Band(sp.prepare_raster(sp.render_text_bitmap(t, w // 2, h)), BENCH_BW, f)
+                 for t, f in (("CALL", -1.5 * BENCH_BW), ("LOGO", 0.5 * BENCH_BW))]
+        for fs in rates:
+            n = h * max(16, int(round(fs / speeds[0])))
+            yield (f"bands/2x{w//2}x{h}/{fs/1e6:g}MHz/{speeds[0]:g}rps", 2 * n,
+                   lambda bands=bands, fs=fs: drain(sp.iter_iq_bands(bands, fs, speeds[0])))
+
+    n = 1 << (21 if quick else 23)
+    iq = (rng.standard_normal(n, dtype=np.float32) + 1j*rng.standard_normal(n, dtype=np.float32)).astype(np.complex64)
+    iq *= 0.3
+    out = os.path.join(tmp, "iq.bin")
+    yield f"save/sc16q11/{n}", n, lambda: sp.save_sc16q11(out, iq)
+    yield f"save/sc8/{n}", n, lambda: sp.save_sc8(out, iq)
+    yield f"save/sc12p/{n}", n, lambda: sp.save_iq(out, iq, "sc12p")
+    for fmt in ("sc12p", "sc8"):
+        raw = sp.pack(sp.quantize(iq, fmt), fmt).tobytes()
+        yield f"expand/{fmt}/{n}", n, lambda raw=raw, fmt=fmt: sp.to_sc16q11(raw, fmt)
+
+def run_bench(quick=False, repeat=3, only=None, log=print):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, n, fn in bench_cases(tmp, quick):
+            if only and only not in name: continue
+            wall, peak = _measure(fn, repeat)
+            results[name] = {"wall_s": wall, "samples": n, "samples_per_s": n / max(wall, 1e-12), "peak_bytes": peak}
+            log(f"{name:48s} {wall*1e3:9.1f} ms {n/max(wall, 1e-12)/1e6:9.1f} MS/s {peak/2**20:8.1f} MiB")
+    return {"meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                     "numpy": np.__version__, "platform": platform.platform(), "cpus": os.cpu_count(),
+                     "quick": quick, "repeat": repeat},
+            "cases": results}
+
+def compare(results, baseline, threshold=BENCH_THRESHOLD):
+    """Regression messages for cases slower or hungrier than baseline by more than threshold."""
+    bad = []
+    for name, base in baseline.get("cases", {}).items():
+        cur = results["cases"].get(name)
+        if cur is None: continue
+        if cur["wall_s"] > base["wall_s"] * (1 + threshold) + BENCH_SLACK_S:
+            bad.append(f"{name}: wall {base['wall_s']*1e3:.1f} -> {cur['wall_s']*1e3:.1f} ms")
+        if cur["peak_bytes"] > base["peak_bytes"] * (1 + threshold) + (1 << 20):
+            bad.append(f"{name}: peak {base['peak_bytes']/2**20:.1f} -> {cur['peak_bytes']/2**20:.1f} MiB")
+    return bad
+
+def main(args, log=print):
+    results = run_bench(args.quick, args.repeat, args.filter, log)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f: json.dump(results, f, indent=1)
+        log(f"Results written to {args.out}")
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f: json.dump(results, f, indent=1)
+        log(f"Baseline updated: {args.baseline}")
+        return 0
+    if args.baseline:
+        try:
+            with open(args.baseline, encoding="utf-8") as f: baseline = json.load(f)
+        except OSError as e:
+            log(f"No baseline ({e}); nothing to compare."); return 0
+        bad = compare(results, baseline, args.threshold)
+        for b in bad: log(f"REGRESSION {b}")
+        log(f"bench: {len(bad)} regression(s) vs {args.baseline} (threshold {args.threshold:.0%})")
+        return 1 if bad else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(sp.main(["bench"] + sys.argv[1:]))
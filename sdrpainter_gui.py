@@ -0,0 +1,654 @@
+# Tk front end for sdrpainter. Loaded by sdrpainter.main() only when the GUI is started.
+
+import os, time, threading, cProfile
+import tkinter as tk
+from tkinter import filedialog, messagebox, END, NORMAL, DISABLED
+from PIL import ImageTk
+
+from sdrpainter import (
+    DEFAULT_TEXT, DEFAULT_FREQ_MHZ, DEFAULT_SR_MHZ, DEFAULT_SPEED, DEFAULT_BW_KHZ, DEFAULT_GAIN_DB,
+    DEFAULT_W, DEFAULT_H, DEFAULT_USB_MODE, STREAM_CHUNK_S,
+    render_text_bitmap, load_image_raster, prepare_raster, iter_iq, chirp_templates,
+    iq_cache_key, IQCache, IncrementalPainter, IQStreamer, make_fifo, unblock_fifo,
+    Stages, STAGE_LOG, PROFILE_OUT, append_jsonl, profile_report, worker_pool,
+    load_manifest, prepare_item, PlaylistRunner, TickerText, iter_ticker, TICKER_DEPTH,
+    BLADERF_FORMATS, FORMAT_DR_DB, SAMPLE_BYTES, DEFAULT_DR_DB, DEFAULT_BLADERF_FORMAT, pick_format,
+    preview_waterfall, preview_image, chirp_resolution, CancelToken, Cancelled,
+)
+from sdrpainter_radio import BladeRFProc, HackRFProc, find_bladerf_cli, find_hackrf_transfer, hackrf_quantize_bb_bw
+
+# ---------- Dark theme ----------
+CLR_BG    = "#0f1115"
+CLR_PANEL = "#141821"
+CLR_TEXT  = "#e6e6e6"
+CLR_MUTED = "#a6a6a6"
+CLR_BTN   = "#1f2430"
+CLR_BTN_H = "#2a3142"
+CLR_EDIT  = "#1a1f2b"
+CLR_EDIT_TXT = "#ffffff"
+CLR_ACCENT= "#2ea043"
+
+PREVIEW_SIZE = (512, 160)       # waterfall preview on screen (px)
+PREVIEW_DELAY_MS = 150          # recompute this long after the last edit
+
+# ---------- GUI ----------
+class App(tk.Tk):
+    def __init__(self):
+        super().__init__()
+        self.title("Spectrum Painter — bladeRF / HackRF — USB / Invert / Auto-scale / Dark")
+        self.configure(bg=CLR_BG)
+        self.geometry("1040x980")
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Backends
+        self.cli = BladeRFProc(find_bladerf_cli(), self._log)
+        self.cli.start()
+        self.hackrf = HackRFProc(find_hackrf_transfer(), self._log)
+        self.after(150, self._poll_cli)
+        worker_pool.warm_async()   # large rasters synthesize on the pool; start it before the first Play
+
+        self.image_path = None
+        self.output_bin_sc16 = os.path.abspath("paint.bin")
+        self.output_bin_sc8  = os.path.abspath("paint_sc8.bin")
+        self.outputs = {"sc16q11": self.output_bin_sc16, "sc8": self.output_bin_sc8,
+                        "sc12p": os.path.abspath("paint_sc12p.bin")}
+        self.iq_cache = IQCache()
+        # Remember what is in each output file so small edits only rewrite changed rows
+        self.painters = {f: IncrementalPainter(p, f, self._log) for f, p in self.outputs.items()}
+
+        # Vars
+        self.mode     = tk.StringVar(value="text")
+        self.text_in  = tk.StringVar(value=DEFAULT_TEXT)
+        self.freq_mhz = tk.StringVar(value=str(DEFAULT_FREQ_MHZ))
+        self.sr_mhz   = tk.StringVar(value=str(DEFAULT_SR_MHZ))
+        self.bw_khz   = tk.StringVar(value=str(DEFAULT_BW_KHZ))
+        self.gain_db  = tk.StringVar(value=str(DEFAULT_GAIN_DB))
+        self.speed_rps= tk.StringVar(value=str(DEFAULT_SPEED))
+        self.r_w      = tk.StringVar(value=str(DEFAULT_W))
+        self.r_h      = tk.StringVar(value=str(DEFAULT_H))
+        self.repeat   = tk.BooleanVar(value=False)
+        self.usb_mode = tk.BooleanVar(value=DEFAULT_USB_MODE)
+        self.usb_fmin_khz = tk.StringVar(value="0")
+        self.invert   = tk.BooleanVar(value=False)
+        self.use_hackrf = tk.BooleanVar(value=False)  # backend selector
+        self.stream_tx  = tk.BooleanVar(value=False)  # pipe IQ straight to the radio, no .bin
+        self.nco_chirp  = tk.BooleanVar(value=False)  # table-driven NCO chirp (float64-accurate phase)
+        self.log_stages = tk.BooleanVar(value=False)  # append per-stage timings to STAGE_LOG
+        self.profile    = tk.BooleanVar(value=False)  # trace memory per stage + cProfile the synthesis
+        self.bladerf_fmt = tk.StringVar(value=DEFAULT_BLADERF_FORMAT)  # "auto" picks by dynamic range
+        self.dyn_range_db = tk.StringVar(value=f"{DEFAULT_DR_DB:g}")
+        self.show_preview = tk.BooleanVar(value=True)  # predicted waterfall, recomputed as fields change
+        self._preview_job = None; self._preview_img = None
+        self.streamer = None
+        self.playlist = None
+        self.ticker = None
+        self.job = None                 # CancelToken of the Play in progress
+        self._play_thread = None
+        self._phase = None              # "synth" until the radio is keyed, then "tx"
+        self._restart = False           # Play pressed during synthesis: run again when it stops
+        self._progress = ""
+        self._playlist_job = None
+        self._playlist_thread = None
+
+        # Bias-T controls
+        self.bias_hackrf = tk.BooleanVar(value=False)
+        self.bias_bladerf_rx = tk.BooleanVar(value=False)
+        self.bias_bladerf_tx = tk.BooleanVar(value=False)
+
+        self._build_ui()
+
+    # ---- UI helpers ----
+    def _panel(self, parent):
+        return tk.Frame(parent, bg=CLR_PANEL, bd=1, highlightthickness=1, highlightbackground="#222833")
+    def _label(self, parent, txt):
+        return tk.Label(parent, text=txt, bg=CLR_PANEL, fg=CLR_MUTED)
+    def _entry(self, parent, var, w=10):
+        return tk.Entry(parent, textvariable=var, width=w, bg=CLR_EDIT, fg=CLR_EDIT_TXT,
+                        insertbackground=CLR_EDIT_TXT, relief="flat")
+    def _button(self, parent, txt, cmd, accent=False):
+        c = CLR_ACCENT if accent else CLR_BTN; fg = "#ffffff" if accent else CLR_TEXT
+        return tk.Button(parent, text=txt, command=cmd, bg=c, fg=fg,
+                         activebackground=CLR_BTN_H, activeforeground=fg, relief="flat", padx=10, pady=4)
+    def _check(self, parent, txt, var):
+        return tk.Checkbutton(parent, text=txt, variable=var, bg=CLR_PANEL, fg=CLR_TEXT,
+                              activebackground=CLR_PANEL, activeforeground=CLR_TEXT,
+                              selectcolor=CLR_BG, relief="flat")
+
+    # ---- Layout ----
+    def _build_ui(self):
+        bar = self._panel(self); bar.pack(fill="x", padx=10, pady=(10,6))
+        tk.Label(bar, text="Mode:", bg=CLR_PANEL, fg=CLR_TEXT).pack(side="left", padx=8, pady=8)
+        for val in ("image","text","ticker"):
+            tk.Radiobutton(bar, text=val.capitalize(), variable=self.mode, value=val,
+                           bg=CLR_PANEL, fg=CLR_TEXT, activebackground=CLR_PANEL,
+                           selectcolor=CLR_BG, command=self._toggle_mode).pack(side="left", padx=6)
+        self._check(bar, "Invert colors", self.invert).pack(side="left", padx=16)
+        self._check(bar, "Use HackRF (instead of bladeRF)", self.use_hackrf).pack(side="right", padx=10)
+
+        self.img_row = self._panel(self)
+        tk.Label(self.img_row, text="Image:", bg=CLR_PANEL, fg=CLR_MUTED).pack(side="left", padx=8, pady=8)
+        self.img_label = tk.Label(self.img_row, text="(none)", bg=CLR_PANEL, fg=CLR_MUTED)
+        self.img_label.pack(side="left", padx=6)
+        self._button(self.img_row, "Open…", self.pick_image).pack(side="left", padx=6)
+
+        self.txt_row = self._panel(self)
+        tk.Label(self.txt_row, text="Text:", bg=CLR_PANEL, fg=CLR_MUTED).pack(side="left", padx=8, pady=8)
+        tk.Entry(self.txt_row, textvariable=self.text_in, width=28,
+                 bg=CLR_EDIT, fg=CLR_EDIT_TXT, insertbackground=CLR_EDIT_TXT,
+                 relief="flat").pack(side="left", padx=6)
+        self.txt_row.pack(fill="x", padx=10, pady=6)
+        # Ticker mode: edits to the text go on air within a few rows
+        self.text_in.trace_add("write", lambda *_: self.ticker and self.ticker.set_text(self.text_in.get()))
+
+        g1 = self._panel(self); g1.pack(fill="x", padx=10, pady=6)
+        for lbl, var in [("Freq (MHz)", self.freq_mhz),
+                         ("BW (kHz)", self.bw_khz),
+                         ("Power (dB)", self.gain_db),
+                         ("Sample-rate (MHz)", self.sr_mhz)]:
+            cell = tk.Frame(g1, bg=CLR_PANEL); cell.pack(side="left", padx=10, pady=8)
+            self._label(cell, lbl).pack(anchor="w")
+            self._entry(cell, var, 10).pack()
+
+        g2 = self._panel(self); g2.pack(fill="x", padx=10, pady=6)
+        for lbl, var in [("Speed (rows/s)", self.speed_rps),
+                         ("Raster W", self.r_w),
+                         ("Raster H", self.r_h)]:
+            cell = tk.Frame(g2, bg=CLR_PANEL); cell.pack(side="left", padx=10, pady=8)
+            self._label(cell, lbl).pack(anchor="w")
+            self._entry(cell, var, 10).pack()
+        cell = tk.Frame(g2, bg=CLR_PANEL); cell.pack(side="left", padx=10, pady=8)
+        self._label(cell, "Dyn range (dB)").pack(anchor="w")
+        self._entry(cell, self.dyn_range_db, 10).pack()
+        cell = tk.Frame(g2, bg=CLR_PANEL); cell.pack(side="left", padx=10, pady=8)
+        self._label(cell, "bladeRF format").pack(anchor="w")
+        om = tk.OptionMenu(cell, self.bladerf_fmt, "auto", *BLADERF_FORMATS)
+        om.config(bg=CLR_EDIT, fg=CLR_EDIT_TXT, activebackground=CLR_BTN_H, relief="flat", highlightthickness=0)
+        om.pack()
+
+        g3 = self._panel(self); g3.pack(fill="x", padx=10, pady=6)
+        self._check(g3, "USB (single-sideband)", self.usb_mode).pack(side="left", padx=10, pady=10)
+        cell_usb = tk.Frame(g3, bg=CLR_PANEL); cell_usb.pack(side="left", padx=10, pady=8)
+        self._label(cell_usb, "USB fmin (kHz)").pack(anchor="w")
+        self._entry(cell_usb, self.usb_fmin_khz, 10).pack()
+        self._check(g3, "Repeat (loop)", self.repeat).pack(side="left", padx=20)
+        self._check(g3, "Stream to radio (no file)", self.stream_tx).pack(side="left", padx=10)
+        self._check(g3, "NCO chirp", self.nco_chirp).pack(side="left", padx=10)
+
+        # Bias-T group
+        bias = self._panel(self); bias.pack(fill="x", padx=10, pady=6)
+        tk.Label(bias, text="Bias-T:", bg=CLR_PANEL, fg=CLR_TEXT).pack(side="left", padx=8, pady=8)
+        self._check(bias, "HackRF antenna power", self.bias_hackrf).pack(side="left", padx=10)
+        self._check(bias, "bladeRF RX bias-tee", self.bias_bladerf_rx).pack(side="left", padx=10)
+        self._check(bias, "bladeRF TX bias-tee", self.bias_bladerf_tx).pack(side="left", padx=10)
+
+        ctl = self._panel(self); ctl.pack(fill="x", padx=10, pady=6)
+        self._button(ctl, "Play", self.play, accent=True).pack(side="left", padx=8, pady=8)
+        self._button(ctl, "Stop", self.stop).pack(side="left", padx=8, pady=8)
+        self._button(ctl, "Playlist…", self.play_playlist).pack(side="left", padx=8, pady=8)
+        self.progress_lbl = tk.Label(ctl, text="", bg=CLR_PANEL, fg=CLR_MUTED, width=24, anchor="w")
+        self.progress_lbl.pack(side="left", padx=8)
+        self._check(ctl, f"Log stages ({STAGE_LOG})", self.log_stages).pack(side="right", padx=10)
+        self._check(ctl, "Profile (memory + cProfile)", self.profile).pack(side="right", padx=10)
+
+        pv = self._panel(self); pv.pack(fill="x", padx=10, pady=6)
+        self.preview_lbl = tk.Label(pv, bg=CLR_BG)
+        self.preview_lbl.pack(side="left", padx=8, pady=8)
+        side = tk.Frame(pv, bg=CLR_PANEL); side.pack(side="left", fill="both", expand=True, padx=8, pady=8)
+        self._check(side, "Waterfall preview", self.show_preview).pack(anchor="w")
+        self.preview_info = tk.Label(side, text="", bg=CLR_PANEL, fg=CLR_MUTED, justify="left", anchor="w",
+                                     wraplength=400)
+        self.preview_info.pack(anchor="w", pady=6)
+        for var in (self.mode, self.text_in, self.sr_mhz, self.bw_khz, self.speed_rps, self.r_w, self.r_h,
+                    self.usb_mode, self.usb_fmin_khz, self.invert, self.show_preview):
+            var.trace_add("write", self._schedule_preview)
+        self._schedule_preview()
+
+        lf = self._panel(self); lf.pack(fill="both", expand=True, padx=10, pady=(6,10))
+        self.log = tk.Text(lf, height=16, bg=CLR_EDIT, fg=CLR_TEXT,
+                           insertbackground=CLR_TEXT, relief="flat", wrap="word")
+        self.log.pack(fill="both", expand=True, padx=6, pady=6)
+        self.log.config(state=DISABLED)
+
+    def _toggle_mode(self):
+        if self.mode.get() == "image":
+            self.txt_row.forget(); self.img_row.pack(fill="x", padx=10, pady=6)
+        else:
+            self.img_row.forget(); self.txt_row.pack(fill="x", padx=10, pady=6)
+
+    # ---- Waterfall preview ----
+    def _schedule_preview(self, *_):
+        if self._preview_job: self.after_cancel(self._preview_job)
+        self._preview_job = self.after(PREVIEW_DELAY_MS, self._update_preview)
+
+    def _update_preview(self):
+        # Predicted from the raster alone (tens of ms), so it runs on the Tk thread
+        self._preview_job = None
+        if not self.show_preview.get() or self.mode.get() == "ticker":
+            self.preview_lbl.config(image="", width=0, height=0); self._preview_img = None
+            self.preview_info.config(text="(no preview in ticker mode)" if self.show_preview.get() else ""); return
+        try:
+            fs = int(float(self.sr_mhz.get()) * 1e6); bw = int(float(self.bw_khz.get()) * 1e3)
+            sp = float(self.speed_rps.get()); W = int(self.r_w.get()); H = int(self.r_h.get())
+            fmin = float(self.usb_fmin_khz.get()) * 1e3 if self.usb_mode.get() else 0.0
+            if min(fs, bw, sp, W, H) <= 0: return
+            bw = min(bw, int(0.9 * fs))
+            if self.mode.get() == "image":
+                if not self.image_path: return
+                img = load_image_raster(self.image_path, W, H)
+            else:
+                img = render_text_bitmap(self.text_in.get().strip() or DEFAULT_TEXT, W, H)
+        except (ValueError, OSError):
+            return
+        t = time.perf_counter()
+        db, f = preview_waterfall(prepare_raster(img, self.invert.get()), fs, bw, sp, self.usb_mode.get(), fmin)
+        self._preview_img = ImageTk.PhotoImage(preview_image(db, PREVIEW_SIZE))
+        self.preview_lbl.config(image=self._preview_img, width=PREVIEW_SIZE[0], height=PREVIEW_SIZE[1])
+        res = chirp_resolution(bw, sp)
+        self.preview_info.config(text=(
+            f"{f[0]/1e3:+.1f} … {f[-1]/1e3:+.1f} kHz around Fc, {H/sp:.1f} s on air (newest row on top)\n"
+            f"Resolution ≈ {res/1e3:.2f} kHz: about {min(W, bw/res):.0f} of {W} columns can be told apart\n"
+            f"Predicted in {(time.perf_counter()-t)*1e3:.0f} ms"))
+
+    # ---- Actions ----
+    def pick_image(self):
+        p = filedialog.askopenfilename(title="Select image",
+                                       filetypes=[("Images","*.png;*.jpg;*.jpeg;*.bmp;*.tif;*.tiff;*.gif;*.webp"),
+                                                  ("Rasters","*.npy;*.gray;*.gray16"), ("All files","*.*")])
+        if not p: return
+        self.image_path = p
+        self.img_label.config(text=os.path.basename(p))
+        self._schedule_preview()
+        self._log(f"Image loaded: {p}")
+
+    def _poll_cli(self):
+        # Drain bladeRF interactive logs; HackRF logs stream directly in its own thread.
+        # Synthesis progress is set by the worker and shown from here, on the Tk thread.
+        self.cli.drain()
+        if self.progress_lbl.cget("text") != self._progress: self.progress_lbl.config(text=self._progress)
+        self.after(150, self._poll_cli)
+
+    def _log(self, msg):
+        self.log.config(state=NORMAL); self.log.insert(END, msg.rstrip()+"\n")
+        self.log.see(END); self.log.config(state=DISABLED)
+
+    def _playlist_busy(self):
+        return bool(self.playlist or (self._playlist_thread and self._playlist_thread.is_alive()))
+
+    def play(self):
+        # One Play at a time. Pressing it again during synthesis restarts with the current
+        # fields (repeated presses coalesce into one restart); once on air, Stop comes first.
+        # Play and Playlist share the radio, so neither starts while the other runs.
+        if self._playlist_busy():
+            self._log("Playlist running; press Stop first."); return
+        if self._play_thread and self._play_thread.is_alive():
+            if self._phase == "synth" and self.job:
+                if not self._restart: self._log("Play pressed again: restarting with the current settings…")
+                self._restart = True; self.job.cancel()
+            else:
+                self._log("Already playing; press Stop first.")
+            return
+        self._play_thread = threading.Thread(target=self._worker, daemon=True)
+        self._play_thread.start()
+
+    def _on_progress(self, frac, rate):
+        self._progress = f"Synthesis {frac:4.0%}  {rate/1e6:.1f} MS/s"
+
+    def _key_up(self):
+        # Last chance to cancel before the radio starts; later, Stop ends the TX
+        self.job.check(); self._phase = "tx"; self._progress = ""
+
+    def play_playlist(self):
+        # Refused while a Play or another Playlist runs (the dialog is modal, so this holds)
+        if self._playlist_busy() or (self._play_thread and self._play_thread.is_alive()):
+            self._log("Already playing; press Stop first."); return
+        p = filedialog.askopenfilename(title="Select playlist (job manifest)",
+                                       filetypes=[("Playlist","*.json;*.jsonl"), ("All files","*.*")])
+        if not p: return
+        self._playlist_thread = threading.Thread(target=self._playlist_worker, args=(p,), daemon=True)
+        self._playlist_thread.start()
+
+    def stop(self):
+        self._restart = False
+        if self.job: self.job.cancel()
+        if self._playlist_job: self._playlist_job.cancel()
+        if self.playlist: self.playlist.stop()
+        if self.streamer: self.streamer.abort()
+        if self.use_hackrf.get():
+            self.hackrf.stop()
+            self._log("HackRF TX stopped.")
+        else:
+            self.cli.send("tx stop")
+            self._log("bladeRF TX stopped.")
+
+    def on_close(self):
+        try:
+            self.hackrf.stop()
+        except: pass
+        try:
+            self.cli.stop()
+        except: pass
+        worker_pool.close()
+        self.destroy()
+
+    # ---- TX worker ----
+    def _worker(self):
+        # Runs again while Play was pressed during synthesis (see play())
+        try:
+            while True:
+                self._restart = False; self._phase = "synth"
+                self.job = CancelToken(self._on_progress)
+                self._play_once()
+                if not self._restart: break
+        finally:
+            self.job = None; self._phase = None; self._progress = ""
+
+    def _play_once(self):
+        # Every stage of the Play is timed into st; the table goes to the log when it ends
+        st = Stages(trace_mem=self.profile.get())
+        prof = cProfile.Profile() if self.profile.get() else None
+        meta = {}
+        try:
+            self._run(st, prof, meta)
+        except Cancelled:
+            self._log("Synthesis cancelled; partial output removed.")
+        finally:
+            st.finish()
+            if st.stats:
+                self._log("Stage timings:\n" + "\n".join(st.table()))
+                if self.log_stages.get():
+                    try:
+                        append_jsonl(STAGE_LOG, st.record(**meta)); self._log(f"Stages appended to {STAGE_LOG}")
+                    except OSError as e:
+                        self._log(f"Could not write {STAGE_LOG}: {e}")
+            if prof and prof.getstats():
+                self._log(f"cProfile of synthesis (saved to {PROFILE_OUT}):\n" + profile_report(prof))
+
+    def _run(self, st, prof, meta):
+        try:
+            fc   = int(float(self.freq_mhz.get()) * 1e6)
+            fs   = int(float(self.sr_mhz.get())   * 1e6)
+            bw   = int(float(self.bw_khz.get())   * 1e3)
+            g    = int(float(self.gain_db.get()))
+            sp   = float(self.speed_rps.get())
+            W    = int(self.r_w.get()); H = int(self.r_h.get())
+            usb  = bool(self.usb_mode.get())
+            fmin = float(self.usb_fmin_khz.get()) * 1e3
+        except Exception as e:
+            self._log(f"Bad parameter: {e}"); return
+
+        # Nyquist safety for painter synthesis
+        if bw > int(0.9 * fs):
+            bw = int(0.9 * fs); self._log(f"Note: BW clamped to {bw/1e3:.1f} kHz for Nyquist.")
+
+        if self.mode.get() == "ticker":
+            self._key_up()
+            return self._ticker(fc, fs, bw, g, sp, W, usb, fmin if usb else 0.0, st)
+
+        # Build raster
+        if self.mode.get() == "image":
+            if not self.image_path:
+                messagebox.showerror("Error", "Select an image first."); return
+            with st("raster", W*H): img = load_image_raster(self.image_path, W, H)
+        else:
+            txt = self.text_in.get().strip() or DEFAULT_TEXT
+            with st("raster", W*H): img = render_text_bitmap(txt, W, H)
+
+        with st("prepare", W*H):
+            img = prepare_raster(img, self.invert.get())  # invert colors, then flip: top row first in time
+
+        # IQ is generated and written chunk by chunk, so RAM stays flat for tall rasters.
+        # In stream mode the chunks go straight to the radio and a loop is fed from here.
+        stream = self.stream_tx.get(); repeat = self.repeat.get()
+        hackrf = self.use_hackrf.get(); fmt = "sc8" if hackrf else self._bladerf_format()
+        fmin = fmin if usb else 0.0
+        chirp = "nco" if self.nco_chirp.get() else "formula"
+        meta.update(fs=fs, bw=bw, speed=sp, w=W, h=H, usb=usb, fmin=fmin, fmt=fmt, chirp=chirp, stream=stream)
+        with st("cache", W*H):
+            key = iq_cache_key(img, fs, bw, sp, usb, fmin, fmt, chirp)
+            cached = self.iq_cache.get(key, fmt)
+        meta["cache_hit"] = bool(cached)
+        if cached:
+            # Same raster and synthesis parameters: replay the file, even in stream mode
+            self._log(f"IQ cache hit: {os.path.basename(cached)}  ({self.iq_cache.stats()})")
+            stream = False
+        else:
+            self._log(f"IQ cache miss  ({self.iq_cache.stats()})")
+            self._log("Generating IQ…")
+        chunks = iter_iq(img, fs, bw, sp, usb=usb, fmin_hz=fmin, repeat=stream and repeat, chirp=chirp,
+                         chunk_rows=max(1, int(STREAM_CHUNK_S*sp)) if stream else None, stages=st, cancel=self.job)
+        dur = img.height / float(sp)
+
+        if hackrf:
+            # HackRF path: write sc8 (or pipe it to stdin), launch hackrf_transfer with quantized BB filter
+            out8 = self.output_bin_sc8
+            if cached:
+                out8 = cached
+            elif not stream:
+                try:
+                    self._paint(img, fs, bw, sp, usb, fmin, chirp, key, fmt, st, prof)
+                except Cancelled:
+                    raise
+                except Exception as e:
+                    self._log(f"ERROR writing BIN (sc8): {e}"); return
+                self._log(f"Wrote {out8}  (≈{dur:.2f} s)")
+                self._cache_put(key, fmt, out8)
+
+            bb_bw = hackrf_quantize_bb_bw(fs, bw)
+            self._log(f"HackRF BB filter set to {bb_bw/1e6:.2f} MHz (requested {bw/1e3:.1f} kHz)")
+
+            self._key_up()
+            with st("radio"):
+                started = self.hackrf.start_tx(
+                    filepath="-" if stream else out8,
+                    freq_hz=fc,
+                    samp_rate_hz=fs,
+                    bb_bw_hz=bb_bw,
+                    tx_gain_db=g,
+                    repeat=repeat,
+                    bias_on=self.bias_hackrf.get()
+                )
+            if not started:
+                self._log("Failed to start HackRF TX.")
+                return
+
+            if stream:
+                proc = self.hackrf.proc
+                self._start_streamer(lambda: proc.stdin)
+                self._stream(chunks, "sc8", st, prof)
+
+            if not repeat:
+                # Wait for the process to end (file streamed once)
+                with st("tx_wait"):
+                    while self.hackrf.proc and self.hackrf.proc.poll() is None:
+                        time.sleep(0.1)
+                self._log("TX complete (file finished).")
+
+        else:
+            # bladeRF path: write fmt (or feed a named pipe) and drive CLI session. bladeRF-cli
+            # reads only SC16 Q11, so compact files are expanded into the FIFO as they play.
+            out = self.outputs[fmt]
+            fifo = make_fifo() if stream or fmt != "sc16q11" else None
+            if stream and not fifo:
+                self._log("Note: named pipes unavailable here; writing the file instead.")
+            if cached:
+                out = cached
+            elif not (stream and fifo):
+                try:
+                    self._paint(img, fs, bw, sp, usb, fmin, chirp, key, fmt, st, prof)
+                except Cancelled:
+                    raise
+                except Exception as e:
+                    self._log(f"ERROR writing BIN ({fmt}): {e}"); return
+                self._log(f"Wrote {out}  (≈{dur:.2f} s, {os.path.getsize(out)/2**20:.1f} MiB {fmt})")
+                self._cache_put(key, fmt, out)
+
+            self._key_up()
+            with st("radio"):
+                # A FIFO cannot rewind: play it once and loop on the feeding side instead
+                started = self._bladerf_tx(fifo or out, fs, fc, bw, g, repeat=0 if repeat and not fifo else 1,
+                                           fifo=bool(fifo))
+            if not started: return
+            self._log("TX started.")
+
+            if fifo and stream:
+                self._stream(chunks, "sc16q11", st, prof)
+            elif fifo:
+                self._stream_file(out, fmt, repeat, st)
+
+            if not repeat:
+                with st("tx_wait"):
+                    self.cli.command("tx wait", timeout=None)
+                    self.cli.command("tx stop")
+                self._log("TX complete (file finished).")
+
+    # ---- bladeRF setup ----
+    def _bladerf_format(self):
+        # Compact formats need the FIFO (bladeRF-cli itself only reads SC16 Q11 files)
+        choice = self.bladerf_fmt.get(); compact = hasattr(os, "mkfifo")
+        if choice == "auto":
+            try: dr = float(self.dyn_range_db.get())
+            except ValueError: dr = DEFAULT_DR_DB
+            fmt = pick_format(dr, compact)
+        elif choice != "sc16q11" and not compact:
+            self._log(f"Note: {choice} needs named pipes; using sc16q11."); fmt = "sc16q11"
+        else:
+            fmt = choice
+        self._log(f"bladeRF format {fmt}: {FORMAT_DR_DB[fmt]:.0f} dB range, {SAMPLE_BYTES[fmt]} bytes/sample")
+        return fmt
+
+    def _bladerf_bias(self):
+        # Bias-T controls for bladeRF (errors will log if unsupported)
+        for ch, var in (("rx", self.bias_bladerf_rx), ("tx", self.bias_bladerf_tx)):
+            self.cli.set("biastee", "on" if var.get() else "off", ch)
+
+    def _bladerf_tx(self, path, fs, fc, bw, g, repeat=1, fifo=False, depth=None):
+        # Unchanged settings are skipped; each command waits for bladeRF-cli to finish it.
+        # For a FIFO the streamer's writer starts before tx start, which opens the file
+        # and would otherwise block bladeRF-cli until a writer connected.
+        self._bladerf_bias()
+        writer = (lambda: self._start_streamer(lambda: open(path, "wb"), lambda: unblock_fifo(path), depth)
+                  ) if fifo else None
+        if self.cli.start_tx(path, {"samplerate": fs, "frequency": fc, "bandwidth": bw, "gain": g}, repeat, writer):
+            return True
+        if self.streamer:
+            self.streamer.abort(); self.streamer.finish(timeout=1.0); self.streamer = None
+        self._log("bladeRF TX not started."); return False
+
+    # ---- Live ticker ----
+    def _ticker(self, fc, fs, bw, g, sp, W, usb, fmin, st):
+        # Streams until Stop; Raster H is unused (the message scrolls for as long as it runs)
+        chirp = "nco" if self.nco_chirp.get() else "formula"
+        self.ticker = TickerText(self.text_in.get(), W, self.invert.get())
+        chunks = iter_ticker(self.ticker, fs, bw, sp, usb, fmin, chirp, stages=st)
+        self._log(f"Ticker: {W} px across {bw/1e3:.1f} kHz at {sp:g} rows/s; edit the text to update it live.")
+        try:
+            if self.use_hackrf.get():
+                bb_bw = hackrf_quantize_bb_bw(fs, bw)
+                with st("radio"):
+                    started = self.hackrf.start_tx("-", fc, fs, bb_bw, g, bias_on=self.bias_hackrf.get())
+                if not started: return
+                proc = self.hackrf.proc
+                self._start_streamer(lambda: proc.stdin, depth=TICKER_DEPTH)
+                self._stream(chunks, "sc8", st)
+            else:
+                fifo = make_fifo()
+                if not fifo:
+                    self._log("Ticker needs named pipes for bladeRF (not available on this platform)."); return
+                with st("radio"):
+                    started = self._bladerf_tx(fifo, fs, fc, bw, g, fifo=True, depth=TICKER_DEPTH)
+                if not started: return
+                self._stream(chunks, "sc16q11", st)
+                self.cli.command("tx stop")
+        finally:
+            self.ticker = None
+        self._log("Ticker stopped.")
+
+    # ---- Playlist worker ----
+    def _playlist_worker(self, path):
+        # Items take synthesis settings from the manifest, falling back to the current fields;
+        # Freq, Power, bias-T and Repeat (loop the list) come from the GUI.
+        try:
+            fc = int(float(self.freq_mhz.get()) * 1e6); g = int(float(self.gain_db.get()))
+            defaults = {"sr_mhz": float(self.sr_mhz.get()), "bw_khz": float(self.bw_khz.get()),
+                        "speed": float(self.speed_rps.get()), "w": int(self.r_w.get()), "h": int(self.r_h.get()),
+                        "usb": bool(self.usb_mode.get()), "fmin_khz": float(self.usb_fmin_khz.get()),
+                        "invert": bool(self.invert.get()), "chirp": "nco" if self.nco_chirp.get() else "formula"}
+            jobs = load_manifest(path, defaults=defaults)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self._log(f"Bad playlist: {e}"); return
+        hackrf = self.use_hackrf.get(); fmt = "sc8" if hackrf else "sc16q11"
+        self._log(f"Playlist: {len(jobs)} item(s) from {os.path.basename(path)}"
+                  f"{' (looping)' if self.repeat.get() else ''}")
+
+        if hackrf:
+            # One hackrf_transfer on stdin per run of items with the same rate and filter
+            running = [None]
+            def queue_tx(item):
+                want = (item["fs"], hackrf_quantize_bb_bw(item["fs"], item["bw"]))
+                if want != running[0]:
+                    self.hackrf.end_feed()
+                    if not self.hackrf.start_tx("-", fc, want[0], want[1], g, bias_on=self.bias_hackrf.get()):
+                        return None
+                    running[0] = want
+                return self.hackrf.queue_file(item["path"])
+        else:
+            self._bladerf_bias()
+            def queue_tx(item):
+                return self.cli.queue_file(item["path"], {"samplerate": item["fs"], "frequency": fc,
+                                                          "bandwidth": item["bw"], "gain": g})
+        # Without echo the bladeRF marks complete on queueing: pace by air time instead
+        timed = hackrf or self.cli.sync is not False
+        if not timed:
+            self._log("Playlist: bladeRF-cli does not answer echo; items are paced by their air time, "
+                      "without prefetch on the radio or gap measurement.")
+
+        self._playlist_job = CancelToken()
+        self.playlist = PlaylistRunner(jobs, lambda job: prepare_item(job, self.iq_cache, fmt, self._playlist_job),
+                                       queue_tx, self._log, loop=self.repeat.get(), timed=timed)
+        try:
+            self.playlist.run()
+        finally:
+            self.playlist = None; self._playlist_job = None
+            if hackrf: self.hackrf.end_feed(timeout=5.0)
+        self._log("Playlist finished.")
+
+    def _paint(self, img, fs, bw, sp, usb, fmin, chirp, key, fmt, st=None, prof=None):
+        # Patching rewrites the file under the previous content's cache entry: drop that entry first
+        if prof: prof.enable()
+        try:
+            self.painters[fmt].update(img, fs, bw, sp, usb, fmin, chirp, key=key, stages=st, cancel=self.job,
+                                      before_patch=lambda prev: prev and self.iq_cache.drop(prev, fmt))
+        finally:
+            if prof: prof.disable()
+        self._log(f"Chirp templates: {chirp_templates.stats()}")
+
+    def _cache_put(self, key, fmt, path):
+        # A patch that kept the old DC/peak within tolerance is up to 1 LSB off a fresh render
+        if self.painters[fmt].exact:
+            self.iq_cache.put(key, fmt, path)
+        else:
+            self._log("Patched output keeps the previous normalization; not cached.")
+
+    def _start_streamer(self, open_sink, unblock=None, depth=None):
+        # Writer thread only; _stream / _stream_file feed it and finish it
+        self.streamer = IQStreamer(self._log, depth) if depth else IQStreamer(self._log)
+        self.streamer.start(open_sink, unblock)
+
+    def _stream_file(self, path, fmt, repeat, st):
+        # Compact IQ file expanded to SC16 Q11 into the FIFO writer; Repeat loops here
+        self._log(f"Feeding {os.path.basename(path)} ({fmt} → sc16q11)…")
+        try:
+            with st("feed"): self.streamer.feed_file(path, fmt, repeat)
+        finally:
+            self.streamer.finish(timeout=5.0)
+            self.streamer = None
+
+    def _stream(self, chunks, fmt, st=None, prof=None):
+        self._log("Streaming IQ to radio…")
+        if prof: prof.enable()
+        try:
+            self.streamer.feed(chunks, fmt, st)
+        finally:
+            if prof: prof.disable()
+            self.streamer.finish(timeout=5.0)
+            self.streamer = None
@@ -0,0 +1,373 @@
+# bladeRF-cli / hackrf_transfer process wrappers for sdrpainter.
+# Imported only when transmitting, so headless rendering never needs the radio tools.
+
+import os, re, time, threading, subprocess, shutil, queue, itertools, collections
+
+from sdrpainter import TxMark
+
+# ---------- bladeRF-cli discovery ----------
+def find_bladerf_cli():
+    for p in [r"C:\bladeRF\bladeRF-cli.exe",
+              r"C:\Program Files\Nuand\bladeRF\bladeRF-cli.exe",
+              r"C:\Program Files (x86)\Nuand\bladeRF\bladeRF-cli.exe"]:
+        if os.path.isfile(p): return p
+    for name in ("bladeRF-cli.exe","bladerf-cli.exe","bladeRF-cli","bladerf-cli"):
+        p = shutil.which(name)
+        if p: return p
+    return None
+
+# ---------- hackrf_transfer discovery ----------
+def find_hackrf_transfer():
+    for p in [r"C:\Program Files\HackRF\hackrf_transfer.exe",
+              r"C:\Program Files (x86)\HackRF\hackrf_transfer.exe",
+              r"C:\hackrf\hackrf_transfer.exe"]:
+        if os.path.isfile(p): return p
+    p = shutil.which("hackrf_transfer.exe") or shutil.which("hackrf_transfer")
+    return p
+
+# ---------- bladeRF interactive wrapper ----------
+# Every command is followed by "echo <tag>"; bladeRF-cli runs commands in order, so the tag
+# coming back marks the command as finished and the lines before it are its response. That
+# gives real round-trip times and error reports instead of fixed sleeps. Settings are cached
+# so an unchanged samplerate/frequency/bandwidth/gain/biastee is not sent again.
+CMD_TIMEOUT    = 5.0            # s to wait for an ordinary command
+FALLBACK_DELAY = 0.05           # s per command when bladeRF-cli does not echo (no sync possible)
+_PROMPT_RE = re.compile(r"^(?:bladeRF>\s*)+")
+_TAG_PREFIX = "sdrp-"
+_ERROR_RE  = re.compile(r"error|invalid|unrecognized|unknown command|failed|not supported", re.I)
+
+class Reply(TxMark):
+    """Outcome of one command, completed by the reader thread when its tag is echoed."""
+    def __init__(self, cmd, tag, key=None):
+        super().__init__()
+        self.cmd = cmd; self.tag = tag; self.key = key
+        self.lines = []; self.sent = time.perf_counter()
+
+    @property
+    def rtt(self): return None if self.t is None else self.t - self.sent
+
+    @property
+    def errors(self): return [l for l in self.lines if _ERROR_RE.search(l)]
+
+    @property
+    def ok(self): return self.t is not None and not self.errors
+
+class BladeRFProc:
+    def __init__(self, cli_path, log_cb, argv=None):
+        self.cli_path = cli_path
+        self.log = log_cb
+        self.argv = argv            # full command line override (stand-ins for tests)
+        self.proc = None
+        self.q = queue.Queue()
+        self.state = {}             # "samplerate tx" -> value last sent; dropped on error/timeout
+        self.sync = None            # echo works (True), does not (False), unknown yet (None)
+        self.skipped = 0
+        self._pending = collections.deque()     # Replies in command order
+        self._lock = threading.Lock()
+        self._tags = itertools.count()
+
+    def start(self):
+        argv = self.argv
+        if argv is None:
+            path = self.cli_path or find_bladerf_cli()
+            if not path or not os.path.isfile(path):
+                self.log("ERROR: bladeRF-cli not found (C:\\bladeRF, Program Files, or PATH)."); return False
+            argv = [path, "-i"]
+        flags = 0
+        if os.name == "nt" and hasattr(subprocess, "CREATE_NO_WINDOW"):
+            flags = subprocess.CREATE_NO_WINDOW
+        try:
+            self.proc = subprocess.Popen(
+                argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                universal_newlines=True, bufsize=1, creationflags=flags
+            )
+        except Exception as e:
+            self.log(f"ERROR launching bladeRF-cli: {e}"); return False
+        self.state.clear(); self._pending.clear(); self.sync = None
+        threading.Thread(target=self._reader, args=(self.proc,), daemon=True).start()
+        return True
+
+    def _reader(self, proc):
+        try:
+            for line in proc.stdout:
+                line = _PROMPT_RE.sub("", line.rstrip())
+                last = line.rsplit(None, 1)[-1] if line else ""
+                done = []
+                with self._lock:
+                    # A tag finishes its Reply and any older one whose echo went missing
+                    if self.sync is not False and last.startswith(_TAG_PREFIX):
+                        for i, p in enumerate(self._pending):
+                            if p.tag == last:
+                                done = [self._pending.popleft() for _ in range(i + 1)]; break
+                    r = self._pending[0] if self._pending and self.sync is not False else None
+                if done:
+                    for d in done: self._done(d)
+                    continue
+                if r and r.cmd: r.lines.append(line)
+                if line: self.q.put(line)
+        except Exception:
+            pass
+        with self._lock:
+            left = list(self._pending); self._pending.clear()
+        for r in left:
+            r.lines.append("Error: bladeRF-cli exited"); self._done(r)
+
+    def _done(self, r):
+        r.set()
+        if r.errors:
+            if r.key: self.state.pop(r.key, None)
+            self.q.put(f"bladeRF ERROR: {r.cmd}: {' / '.join(e.strip() for e in r.errors)}")
+
+    def drain(self):
+        try:
+            while True: self.log(self.q.get_nowait())
+        except queue.Empty:
+            pass
+
+    def send(self, cmd, key=None):
+        """Queue cmd without waiting; returns its Reply (None if bladeRF-cli is not running)."""
+        if not self.proc or not self.proc.stdin or self.proc.poll() is not None: return None
+        r = Reply(cmd.strip(), f"{_TAG_PREFIX}{next(self._tags)}", key)
+        # Queue and write under one lock: the Tk thread (Stop) and the worker both send, and
+        # the reader relies on _pending being in the order bladeRF-cli receives the commands
+        with self._lock:
+            if self.sync is False:
+                text = f"{r.cmd}\n"
+            else:
+                text = (f"{r.cmd}\n" if r.cmd else "") + f"echo {r.tag}\n"
+                self._pending.append(r)
+            try:
+                self.proc.stdin.write(text); self.proc.stdin.flush()
+            except (OSError, ValueError):
+                if self._pending and self._pending[-1] is r: self._pending.pop()
+                return None
+        if self.sync is False:
+            time.sleep(FALLBACK_DELAY); r.set()
+        return r
+
+    def command(self, cmd, timeout=CMD_TIMEOUT, key=None):
+        """
+        Send cmd and wait until bladeRF-cli has finished it (timeout=None waits forever).
+        Logs the round-trip time; errors are logged by the reader. Returns the Reply or None.
+        """
+        r = self.send(cmd, key)
+        if r is None:
+            self.q.put(f"bladeRF ERROR: {cmd}: bladeRF-cli is not running"); return None
+        if not r.ev.wait(timeout):
+            if self.sync is None:
+                # First command never echoed: this bladeRF-cli cannot be synchronized
+                self.sync = False
+                with self._lock: self._pending.clear()
+                self.q.put(f"bladeRF-cli did not answer echo; using {FALLBACK_DELAY*1e3:.0f} ms per command.")
+                r.set(); return r
+            self.state.clear()
+            self.q.put(f"bladeRF ERROR: {cmd}: no response in {timeout:.1f} s"); return r
+        if self.sync is None: self.sync = True
+        if r.ok: self.q.put(f"bladeRF> {r.cmd}  ({r.rtt*1e3:.0f} ms)")
+        return r
+
+    def set(self, param, value, ch="tx", wait=True):
+        """
+        'set <param> <ch> <value>' unless the cached device state already has that value.
+        Returns the Reply, or None when skipped.
+        """
+        key = f"{param} {ch}"; value = str(value)
+        if self.state.get(key) == value:
+            self.skipped += 1; return None
+        self.state[key] = value
+        cmd = f"set {param} {ch} {value}"
+        r = self.command(cmd, key=key) if wait else self.send(cmd, key)
+        if r is None: self.state.pop(key, None)     # never reached bladeRF-cli
+        return r
+
+    def configure(self, settings, ch="tx", wait=True):
+        """set() each of settings ({"samplerate": fs, ...}); True if none failed."""
+        replies = [self.set(k, v, ch, wait) for k, v in settings.items()]
+        skipped = sum(r is None for r in replies)
+        if skipped and wait: self.q.put(f"bladeRF: {skipped} unchanged setting(s) skipped")
+        return all(r is None or r.ok or not wait for r in replies)
+
+    def start_tx(self, path, settings, repeat=1, writer=None):
+        """
+        configure(settings), tx config and tx start for path; True once transmitting.
+        bladeRF-cli opens the file inside tx start, and opening a FIFO blocks until a
+        writer connects, so writer() (which must start that writer) runs just before it.
+        """
+        self.configure(settings)
+        r = self.command(f'tx config file="{path}" format=bin repeat={repeat}')
+        if r is not None and r.ok:
+            if writer: writer()
+            r = self.command("tx start")
+        return r is not None and r.ok
+
+    def mark(self):
+        """TxMark set when bladeRF-cli reaches this point of its command queue."""
+        return self.send("")
+
+    def queue_file(self, path, settings):
+        """
+        Queue one play of path with the given tx settings ({"samplerate": fs, ...}) behind
+        whatever bladeRF-cli is doing, and return its (on, off) marks. Commands run in
+        order, so an item queued while another plays starts right after its tx wait.
+        Returns None if bladeRF-cli is not running. Without echo (sync False) the marks
+        are set as soon as the commands are written, not when the item plays.
+        """
+        for k, v in settings.items():
+            if self.set(k, v, wait=False) is None and f"{k} tx" not in self.state: return None
+        replies = [self.send(c) for c in (f'tx config file="{path}" format=bin repeat=1',
+                                          "tx start", "tx wait", "tx stop")]
+        if any(r is None for r in replies): return None
+        return replies[1], replies[3]
+
+    def stop(self):
+        try: self.send("tx stop")
+        except: pass
+        try:
+            if self.proc and self.proc.stdin:
+                self.proc.stdin.write("quit\n"); self.proc.stdin.flush()
+        except: pass
+        try:
+            if self.proc: self.proc.wait(timeout=1.0)
+        except Exception:
+            pass
+        self.state.clear()
+
+# ---------- HackRF one-shot runner ----------
+class HackRFProc:
+    """
+    Thin wrapper around hackrf_transfer for TX from file, or from stdin when
+    filepath is "-" (streaming: write IQ bytes to proc.stdin).
+    """
+    def __init__(self, exe_path, log_cb):
+        self.exe_path = exe_path
+        self.log = log_cb
+        self.proc = None
+        self._reader_thread = None
+        self._feed = None
+
+    def start_tx(self, filepath, freq_hz, samp_rate_hz, bb_bw_hz, tx_gain_db, repeat=False, bias_on=False):
+        path = self.exe_path or find_hackrf_transfer()
+        if not path or not os.path.isfile(path):
+            self.log("ERROR: hackrf_transfer not found (Program Files, C:\\hackrf, or PATH)."); return False
+
+        # Clamp gain to HackRF's VGA 0..47 dB
+        tx_gain_db = int(max(0, min(47, int(tx_gain_db))))
+
+        cmd = [
+            path,
+            "-t", filepath,
+            "-f", str(int(freq_hz)),
+            "-s", str(int(samp_rate_hz)),
+            "-x", str(tx_gain_db),
+            "-b", str(int(bb_bw_hz))
+        ]
+        stream = filepath == "-"
+        if repeat and not stream:
+            cmd.append("-R")  # repeat indefinitely (streams loop on the feeding side)
+        if bias_on:
+            cmd.extend(["-a", "1"])  # antenna power ON
+
+        flags = 0
+        if os.name == "nt" and hasattr(subprocess, "CREATE_NO_WINDOW"):
+            flags = subprocess.CREATE_NO_WINDOW
+
+        try:
+            # Binary pipes: stdin carries raw sc8 when streaming, stdout is decoded per line
+            self.proc = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE if stream else None,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                creationflags=flags
+            )
+        except Exception as e:
+            self.log(f"ERROR launching hackrf_transfer: {e}"); return False
+
+        self._reader_thread = threading.Thread(target=self._reader, daemon=True)
+        self._reader_thread.start()
+        self.log("HackRF TX started.")
+        return True
+
+    def _reader(self):
+        try:
+            for line in self.proc.stdout:
+                self.log(line.decode(errors="replace").rstrip())
+        except Exception:
+            pass
+        finally:
+            self.log("HackRF process ended.")
+
+    def queue_file(self, path, chunk=1 << 20):
+        """
+        Append a file to the stdin stream of a start_tx("-") session; returns (on, off) marks,
+        set when its first byte is handed to the pipe and after its last one. Files queued
+        back to back reach the radio as one continuous stream.
+        """
+        on, off = TxMark(), TxMark()
+        if self._feed is None:
+            self._feed = queue.Queue()
+            threading.Thread(target=self._feeder, args=(self.proc, self._feed, chunk), daemon=True).start()
+        self._feed.put((path, on, off))
+        return on, off
+
+    def _feeder(self, proc, q, chunk):
+        try:
+            while True:
+                it = q.get()
+                if it is None: break
+                path, on, off = it
+                with open(path, "rb") as f:
+                    b = f.read(chunk); on.set()
+                    while b:
+                        proc.stdin.write(b)
+                        b = f.read(chunk)
+                proc.stdin.flush(); off.set()
+        except (OSError, ValueError):
+            pass                    # hackrf_transfer stopped
+        finally:
+            try: proc.stdin.close()
+            except (OSError, ValueError): pass
+
+    def end_feed(self, timeout=None):
+        """Close stdin after the queued files and wait for hackrf_transfer to finish them."""
+        if self._feed is None: return
+        self._feed.put(None); self._feed = None
+        proc = self.proc
+        try:
+            if proc: proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            pass
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            try:
+                self.proc.terminate()
+                try:
+                    self.proc.wait(timeout=1.0)
+                except subprocess.TimeoutExpired:
+                    self.proc.kill()
+            except Exception:
+                pass
+        self.proc = None
+        if self._feed is not None:
+            self._feed.put(None); self._feed = None
+
+# ---- HackRF baseband filter quantizer ----
+def hackrf_quantize_bb_bw(fs_hz: int, req_bw_hz: int) -> int:
+    """
+    Snap requested BW to HackRF's allowed baseband filters.
+    Enforces minimum 1.75 MHz and caps by sample rate and ~device max (20 MHz typical).
+    """
+    allowed = [
+        1_750_000, 2_500_000, 3_500_000, 5_000_000, 5_500_000, 6_000_000,
+        7_000_000, 8_000_000, 9_000_000, 10_000_000, 12_000_000, 14_000_000,
+        15_000_000, 20_000_000
+    ]
+    cap = max(1_750_000, min(int(fs_hz), 20_000_000))
+    candidates = [v for v in allowed if v <= cap]
+    if not candidates:
+        return 1_750_000
+    target = max(1_750_000, int(req_bw_hz))
+    for v in candidates:
+        if v >= target:
+            return v
+    return candidates[-1]
@@ -0,0 +1,49 @@
+# Stand-in for "bladeRF-cli -i": prompt, echo, set commands that take a while, errors worded
+# like the real CLI's, and tx start/wait timed from the configured file at the set rate.
+# With --no-echo it ignores echo, like a CLI that cannot be synchronized.
+
+import sys, re, time, threading
+echo = "--no-echo" not in sys.argv
+lat = {"samplerate": 0.03, "frequency": 0.02, "bandwidth": 0.02, "gain": 0.01, "biastee": 0.01}
+fs = 1e6; path = None; repeat = 1; tx = None; halt = threading.Event(); sent = [0]
+def out(s): sys.stdout.write(s + "\n"); sys.stdout.flush()
+def play(f, repeat):
+    # Reads the tx file at the sample rate, like the radio; a FIFO ends when its writer closes
+    t0 = time.perf_counter(); n = 0
+    while not halt.is_set():
+        b = f.read(1 << 14)
+        if not b:
+            repeat -= 1
+            if repeat == 0 or not f.seekable(): break
+            f.seek(0); continue
+        n += len(b) // 4; ahead = n / fs - (time.perf_counter() - t0)
+        if ahead > 0: time.sleep(ahead)
+    f.close(); sent[0] = n
+while True:
+    sys.stdout.write("bladeRF> "); sys.stdout.flush()
+    line = sys.stdin.readline()
+    if not line: break
+    a = line.split()
+    if not a: continue
+    if a[0] == "echo":
+        if echo: out(" ".join(a[1:]))
+    elif a[0] == "set" and len(a) == 4 and a[1] in lat:
+        time.sleep(lat[a[1]])
+        if a[1] == "samplerate": fs = float(a[3])
+    elif a[0] == "set":
+        out(f"  Error: Invalid parameter ({' '.join(a[1:])})")
+    elif a[:2] == ["tx", "config"]:
+        m = re.search(r'file="([^"]*)"', line); path = m and m.group(1)
+        m = re.search(r"repeat=(\d+)", line); repeat = int(m.group(1)) if m else 1
+    elif a[:2] == ["tx", "start"]:
+        # Opened here, as bladeRF-cli does: blocks on a FIFO until a writer connects
+        try: f = open(path or "", "rb")
+        except OSError: out("  Error: File not found"); continue
+        halt.clear(); tx = threading.Thread(target=play, args=(f, repeat)); tx.start()
+    elif a[:2] == ["tx", "wait"]:
+        if tx: tx.join(); out(f"  {sent[0]} samples sent")
+    elif a[:2] == ["tx", "stop"]:
+        halt.set()
+        if tx: tx.join(); tx = None
+    elif a[0] == "quit": break
+    else: out(f"Unrecognized command: {a[0]}")
@@ -0,0 +1,14 @@
+# Stand-in for a radio: consumes a stream from stdin or a path, optionally at a fixed
+# byte rate, and prints "<bytes> <sha256>".
+# Usage: fake_sink.py <path or -> <bytes/s, 0 = unpaced>
+
+import sys, hashlib, time
+src = sys.stdin.buffer if sys.argv[1] == "-" else open(sys.argv[1], "rb")
+rate = float(sys.argv[2]); h = hashlib.sha256(); n = 0; t0 = time.perf_counter()
+while True:
+    b = src.read(1 << 16)
+    if not b: break
+    h.update(b); n += len(b)
+    lag = n / rate - (time.perf_counter() - t0) if rate else 0
+    if lag > 0: time.sleep(lag)
+print(n, h.hexdigest())
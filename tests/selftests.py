@@ -0,0 +1,502 @@
+# Self-tests for sdrpainter (no radio needed): each check runs against local stand-in
+# processes and returns True on success. Run with: python sdrpainter.py selftest [names]
+# or python -m pytest tests
+
+import os, re, sys, time, threading, subprocess, queue, hashlib, tempfile, collections, tracemalloc
+import numpy as np
+from PIL import Image, ImageOps, ImageDraw
+
+from sdrpainter import (
+    BAND_BALANCE, BLADERF_FORMATS, CHIRP_KINDS, FORMAT_DR_DB, IQ_FORMATS, JOB_DEFAULTS, PEAK_SCALE,
+    TICKER_BLOCK_S, TICKER_DEPTH, Band, CancelToken, Cancelled, IQCache, IQStreamer, IncrementalPainter,
+    MultiBandSynth, PlaylistRunner, RowSynth, TickerText, TxMark, _chirp, build_iq_mp, chirp_resolution,
+    iter_iq, iter_iq_bands, iter_ticker, make_fifo, pick_format, prepare_item, prepare_raster,
+    preview_image, preview_waterfall, quantize, quantize_sc8, render_text_bitmap, save_iq,
+    save_iq_stream, to_sc16q11, unblock_fifo, worker_pool)
+
+# Stand-in radio processes (see the header of each script)
+HERE = os.path.dirname(os.path.abspath(__file__))
+FAKE_SINK = os.path.join(HERE, "fake_sink.py")
+FAKE_BLADERF_CLI = os.path.join(HERE, "fake_bladerf_cli.py")
+
+def _sink_cmd(src, rate=0.0):
+    return [sys.executable, FAKE_SINK, src, str(rate)]
+
+def selftest_stream(log=print):
+    """Stream a test raster through stdin and a FIFO into checksumming stand-in processes."""
+    img = ImageOps.flip(render_text_bitmap("STREAM", 256, 64))
+    fs, bw, sp = 2_000_000, 100_000, 30.0
+    ref = hashlib.sha256(); n_ref = 0
+    for iq in iter_iq(img, fs, bw, sp):
+        b = quantize_sc8(iq); ref.update(b); n_ref += b.nbytes
+    want = f"{n_ref} {ref.hexdigest()}"
+    rate = 4 * 2 * fs  # sc8 at 4x real time: slow enough to exercise backpressure
+    ok = True
+
+    proc = subprocess.Popen(_sink_cmd("-", rate), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    st = IQStreamer(log); st.start(lambda: proc.stdin)
+    st.feed(iter_iq(img, fs, bw, sp, chunk_rows=4), "sc8"); st.finish(timeout=30)
+    got = proc.stdout.read().decode().strip(); proc.wait(timeout=30)
+    log(f"stdin sink: {'OK' if got == want else 'MISMATCH ' + got}")
+    ok &= got == want
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fifo = make_fifo(os.path.join(tmp, "paint.fifo"))
+        if fifo is None:
+            log("fifo sink: skipped (no named pipes on this platform)")
+            return ok
+        proc = subprocess.Popen(_sink_cmd(fifo), stdout=subprocess.PIPE)
+        st = IQStreamer(log); st.start(lambda: open(fifo, "wb"), lambda: unblock_fifo(fifo))
+        st.feed(iter_iq(img, fs, bw, sp, chunk_rows=4), "sc8"); st.finish(timeout=30)
+        got = proc.stdout.read().decode().strip(); proc.wait(timeout=30)
+        log(f"fifo sink: {'OK' if got == want else 'MISMATCH ' + got}")
+        ok &= got == want
+    return ok
+
+def _chirp_reference(fs_hz, bw_hz, rows_per_s, usb=True, fmin_hz=0.0):
+    # float64 phase on the same sample grid, reduced mod one cycle before the exp
+    row_t = 1.0 / max(1e-6, rows_per_s)
+    Ns = max(16, int(round(fs_hz * row_t))); n = np.arange(Ns, dtype=np.float64); dt = row_t / Ns
+    f0 = float(fmin_hz) if usb else -bw_hz/2.0; k = float(bw_hz) / row_t
+    cyc = np.mod(f0*dt*n, 1.0) + np.mod(0.5*k*dt*dt*n*n, 1.0)
+    return np.exp(2j*np.pi*cyc)
+
+def selftest_nco(log=print, max_err_rad=1e-4):
+    """Bound NCO phase error against a float64 reference and compare speed with the formula."""
+    ok = True
+    for fs, bw, sp, usb, fmin in [(2e6, 100e3, 30.0, True, 10e3), (2e6, 100e3, 30.0, False, 0.0),
+                                  (10e6, 4e6, 2.0, True, 1e6), (20e6, 8e6, 2.0, False, 0.0)]:
+        ref = _chirp_reference(fs, bw, sp, usb, fmin)
+        res = {}
+        for kind in CHIRP_KINDS:
+            t = time.perf_counter(); Ns, e = _chirp(fs, bw, sp, usb, fmin, kind); dt = time.perf_counter() - t
+            res[kind] = (float(np.max(np.abs(np.angle(e * np.conj(ref))))), dt)
+        err, t_nco = res["nco"]; err_f, t_f = res["formula"]
+        good = err <= max_err_rad and Ns == ref.size
+        log(f"fs={fs/1e6:g} MHz bw={bw/1e3:g} kHz {sp:g} rows/s {'USB' if usb else 'DSB'}: Ns={Ns}  "
+            f"phase err nco={err:.2e} rad, formula={err_f:.2e} rad  "
+            f"time nco={t_nco*1e3:.1f} ms, formula={t_f*1e3:.1f} ms ({t_f/max(t_nco, 1e-9):.1f}x)"
+            f"{'' if good else '  FAIL'}")
+        ok &= good
+    return ok
+
+def _reference_quantize(iq, fmt):
+    # The original separate real/imag/clip/interleave implementation
+    dtype, scale, lo, hi = IQ_FORMATS[fmt]
+    i = np.clip(np.real(iq)*scale, lo, hi).astype(dtype)
+    q = np.clip(np.imag(iq)*scale, lo, hi).astype(dtype)
+    inter = np.empty(i.size*2, dtype=dtype)
+    inter[0::2], inter[1::2] = i, q
+    if fmt == "sc12p":
+        w = (i.astype(np.int64) & 0xFFF) | ((q.astype(np.int64) & 0xFFF) << 12)
+        return np.stack([w & 0xFF, (w >> 8) & 0xFF, w >> 16], axis=1).astype(np.uint8).reshape(-1)
+    return inter
+
+def _traced(fn):
+    # (seconds, peak traced bytes) of fn(); NumPy buffers are visible to tracemalloc
+    tracemalloc.start(); tracemalloc.reset_peak()
+    t = time.perf_counter()
+    try:
+        fn()
+        return time.perf_counter() - t, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def selftest_writers(log=print, n=1 << 23):
+    """Fused writers match the reference byte for byte; report MB/s and peak memory before/after."""
+    rng = np.random.default_rng(1)
+    iq = (rng.standard_normal(n, dtype=np.float32) + 1j*rng.standard_normal(n, dtype=np.float32)).astype(np.complex64)
+    iq *= 0.4; iq[:4] = [1.5+0j, -1.5j, 0.999+0.999j, -1.0-1.0j]      # clipping and edge cases
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "iq.bin")
+        for fmt in IQ_FORMATS:
+            def old():
+                with open(path, "wb") as f: _reference_quantize(iq, fmt).tofile(f)
+            t_old, m_old = _traced(old)
+            with open(path, "rb") as f: want = f.read()
+            t_new, m_new = _traced(lambda: save_iq(path, iq, fmt))
+            with open(path, "rb") as f: same = f.read() == want
+            t_str, m_str = _traced(lambda: save_iq_stream(path, (iq[s:s+100_000] for s in range(0, n, 100_000)), fmt))
+            with open(path, "rb") as f: same &= f.read() == want
+            mb = len(want) / 1e6
+            log(f"{fmt}: {'OK' if same else 'MISMATCH'}  {mb:.0f} MB  "
+                f"before {mb/t_old:.0f} MB/s peak {m_old/2**20:.1f} MiB | "
+                f"after {mb/t_new:.0f} MB/s peak {m_new/2**20:.1f} MiB | "
+                f"chunked {mb/t_str:.0f} MB/s peak {m_str/2**20:.1f} MiB")
+            ok &= same
+    return ok
+
+def selftest_formats(log=print, W=512, H=128, fs=4_000_000, sp=40.0):
+    """Compact bladeRF files expand to the exact SC16 Q11 stream; size and throughput per format."""
+    img = prepare_raster(render_text_bitmap("FORMATS", W, H)); ok = True
+    ok &= pick_format(40) == "sc8" and pick_format(60) == "sc12p" and pick_format(60, False) == "sc16q11"
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {f: os.path.join(tmp, f"paint.{f}.bin") for f in BLADERF_FORMATS}
+        rates = {}
+        for f, p in paths.items():
+            t = time.perf_counter(); n = save_iq_stream(p, iter_iq(img, fs, 100e3, sp), f)
+            rates[f] = n / (time.perf_counter() - t)
+        with open(paths["sc16q11"], "rb") as f: want16 = f.read()
+        with open(paths["sc8"], "rb") as f: want8 = (np.frombuffer(f.read(), dtype=np.int8).astype(np.int16) << 4).tobytes()
+        for f, p in paths.items():
+            with open(p, "rb") as fh: raw = fh.read()
+            t = time.perf_counter(); out = to_sc16q11(raw, f); t = time.perf_counter() - t
+            want = want8 if f == "sc8" else want16
+            # The same bytes again through the streamer into a checksumming stand-in radio
+            proc = subprocess.Popen(_sink_cmd("-"), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            s = IQStreamer(lambda m: None); s.start(lambda: proc.stdin)
+            s.feed_file(p, f, samples=50_000); s.finish(timeout=30)
+            got = proc.stdout.read().decode().split(); proc.wait(timeout=30)
+            same = out.tobytes() == want and got == [str(len(want)), hashlib.sha256(want).hexdigest()]
+            ok &= same
+            log(f"{f:8s} {len(raw)/2**20:6.2f} MiB ({len(raw)/len(want16):4.0%}), {FORMAT_DR_DB[f]:4.1f} dB, "
+                f"render {rates[f]/1e6:5.1f} MS/s, expand {out.size/2/max(t, 1e-9)/1e6:6.1f} MS/s  "
+                f"{'OK' if same else 'MISMATCH'}")
+        # In-place row patching of a packed file matches the same patch of an SC16 Q11 file
+        edit = img.copy(); ImageDraw.Draw(edit).rectangle((10, 10, 13, 11), fill=128)
+        files = {}
+        for f in ("sc12p", "sc16q11"):
+            pa = IncrementalPainter(paths[f], f, lambda m: None)
+            pa.update(img, fs, 100e3, sp); patched = pa.update(edit, fs, 100e3, sp)
+            with open(paths[f], "rb") as fh: files[f] = fh.read()
+        same = to_sc16q11(files["sc12p"], "sc12p").tobytes() == files["sc16q11"]
+        ok &= same and patched < H
+        log(f"sc12p patch: {patched}/{H} rows {'OK' if same else 'MISMATCH'}")
+        # Only a patch that matches a fresh render byte for byte may be cached by content key
+        small = prepare_raster(render_text_bitmap("PATCH", 128, 32)); p8 = os.path.join(tmp, "patch.sc8")
+        fresh = os.path.join(tmp, "fresh.sc8"); exact = {}
+        for name, fill in (("1 px", 255), ("none", None)):
+            edit = small.copy()
+            if fill is not None: edit.putpixel((3, 3), fill)
+            pa = IncrementalPainter(p8, "sc8", lambda m: None)
+            pa.update(small, fs, 100e3, sp); pa.update(edit, fs, 100e3, sp)
+            save_iq_stream(fresh, iter_iq(edit, fs, 100e3, sp), "sc8")
+            with open(p8, "rb") as a, open(fresh, "rb") as b: same = a.read() == b.read()
+            ok &= same or not pa.exact; exact[name] = (pa.exact, same)
+        ok &= exact["none"] == (True, True)
+        log("sc8 patch vs fresh render: " + ", ".join(f"{k} exact={e} same={s}" for k, (e, s) in exact.items()))
+    return ok
+
+def selftest_preview(log=print, fs=1_000_000, bins=96):
+    """Analytic waterfall matches an STFT of the synthesized IQ on sampled rows, and is fast."""
+    ok = True
+    for txt, W, H, bw, rps, usb, fmin in [("PAINT", 128, 48, 100e3, 20.0, True, 10e3),
+                                          ("Hi!", 96, 40, 200e3, 10.0, False, 0.0),
+                                          ("EDGE", 128, 40, 100e3, 20.0, True, 0.0)]:
+        img = prepare_raster(render_text_bitmap(txt, W, H))
+        db, fc = preview_waterfall(img, fs, bw, rps, usb, fmin, bins=bins)
+        df = fc[1] - fc[0]; edges = np.append(fc - df/2, fc[-1] + df/2)
+        rows = np.linspace(0, H-1, 12).round().astype(np.intp)
+        pred = 10**(db[rows] / 10)                      # H < PREVIEW_ROWS: one preview row per raster row
+        # Real STFT: Hann windows matched to the sweep rate, power averaged over each row
+        X = build_iq_mp(img, fs, bw, rps, usb, fmin, engine="numpy")[0].reshape(H, -1)
+        Nw = int(round(fs / chirp_resolution(bw, rps))); nfft = 1 << 16; win = np.hanning(Nw)
+        f = np.fft.fftshift(np.fft.fftfreq(nfft, 1/fs)); b = np.digitize(f, edges) - 1; inb = (b >= 0) & (b < bins)
+        meas = []
+        for r in rows:
+            segs = np.lib.stride_tricks.sliding_window_view(X[r], Nw)[::max(1, Nw//4)] * win
+            p = (np.abs(np.fft.fftshift(np.fft.fft(segs, nfft), axes=1))**2).mean(0)
+            meas.append(np.bincount(b[inb], p[inb], bins) / np.maximum(1, np.bincount(b[inb], None, bins)))
+        meas = np.array(meas); meas *= (pred*meas).sum() / (meas*meas).sum()    # best overall scale
+        corr = np.corrcoef(pred.ravel(), meas.ravel())[0, 1]
+        pdb = 10*np.log10(np.maximum(pred, 1e-12)); mdb = 10*np.log10(np.maximum(meas, 1e-12))
+        lit = (pdb > -20) | (mdb > -20); err = float(np.median(np.abs(pdb - mdb)[lit]))
+        good = corr > 0.98 and err < 1.0; ok &= good
+        log(f"{txt:5s} {'USB' if usb else 'DSB'} {bw/1e3:g} kHz {rps:g} rows/s: correlation {corr:.3f}, "
+            f"median error {err:.2f} dB on lit bins ({'OK' if good else 'FAILED'})")
+    img = prepare_raster(render_text_bitmap("HELLO", 1024, 512)); t = time.perf_counter()
+    preview_image(preview_waterfall(img, 2e6, 100e3, 30.0)[0], (512, 160)); t = time.perf_counter() - t
+    ok &= t < 0.25; log(f"1024x512 preview in {t*1e3:.0f} ms")
+    return ok
+
+def _shm_names():
+    try: return set(os.listdir("/dev/shm"))
+    except OSError: return set()
+
+def selftest_pool(log=print, W=512, H=256, fs=2_000_000, rps=25.0):
+    """Shared-memory pool output is byte-identical to the in-process engine and leaks no blocks."""
+    img = prepare_raster(render_text_bitmap("POOL", W, H))
+    before = _shm_names(); ok = True
+    t = time.perf_counter(); worker_pool.warm(); t_warm = time.perf_counter() - t
+    ref, _ = build_iq_mp(img, fs, 100e3, rps, engine="numpy")
+    t = time.perf_counter(); ref, _ = build_iq_mp(img, fs, 100e3, rps, engine="numpy"); t_np = time.perf_counter() - t
+    t = time.perf_counter(); got, _ = build_iq_mp(img, fs, 100e3, rps, engine="mp"); t_mp = time.perf_counter() - t
+    same = got.tobytes() == ref.tobytes(); ok &= same; del got
+    log(f"build_iq_mp: {'OK' if same else 'MISMATCH'}  {ref.size/1e6:.1f} MS  numpy {t_np*1e3:.0f} ms, "
+        f"pool {t_mp*1e3:.0f} ms on {worker_pool.processes} worker(s) (warm-up {t_warm*1e3:.0f} ms)")
+    for chunk_rows in (None, 7):
+        got = np.concatenate([c.copy() for c in iter_iq(img, fs, 100e3, rps, chunk_rows=chunk_rows, engine="mp")])
+        same = got.tobytes() == ref.tobytes(); ok &= same
+        log(f"iter_iq chunk_rows={chunk_rows}: {'OK' if same else 'MISMATCH'}")
+    with tempfile.TemporaryDirectory() as tmp:
+        outs = []
+        for engine in ("numpy", "mp"):
+            p = os.path.join(tmp, f"{engine}.bin")
+            IncrementalPainter(p, "sc16q11", lambda m: None, engine=engine).update(img, fs, 100e3, rps)
+            with open(p, "rb") as f: outs.append(f.read())
+        same = outs[0] == outs[1]; ok &= same
+        log(f"painter rebuild: {'OK' if same else 'MISMATCH'}")
+    leaked = _shm_names() - before
+    ok &= not leaked
+    log(f"shared memory blocks left behind: {len(leaked)}")
+    return ok
+
+def selftest_ticker(log=print, seconds=4.0, fs=1_000_000, sp=40.0, W=128):
+    """Sustained real-time ticker into a rate-limited sink: no underruns, flat memory, live text change."""
+    ok = True
+    t = TickerText("AAAA", W); t.rows(5); t.set_text("B")
+    same = np.array_equal(t.rows(1)[0], t._glyph("B")[0]); ok &= same
+    B = max(1, int(round(TICKER_BLOCK_S * sp)))
+    log(f"text change: {'OK' if same else 'FAILED'}, on air after ≈{(TICKER_DEPTH + 2) * B} rows "
+        f"({(TICKER_DEPTH + 2) * B / sp:.2f} s) of queued blocks")
+
+    peaks = []
+    for msg in ("CQ", "".join(chr(65 + i % 26) for i in range(5000))):
+        tracemalloc.start()
+        try:
+            for _, _ in zip(iter_ticker(TickerText(msg, W), fs, 100e3, sp), range(200)): pass
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    flat = peaks[1] < 1.5 * peaks[0] + (1 << 20); ok &= flat
+    log(f"memory: {peaks[0]/2**20:.1f} MiB for 2 chars vs {peaks[1]/2**20:.1f} MiB for 5000 chars "
+        f"({'OK' if flat else 'GROWS'})")
+
+    rate = 2 * fs                                   # sc8 bytes/s at real time
+    proc = subprocess.Popen(_sink_cmd("-", rate), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    ticker = TickerText("SELFTEST DE N0CALL", W)
+    st = IQStreamer(lambda m: None, depth=TICKER_DEPTH); st.start(lambda: proc.stdin)
+    threading.Timer(seconds / 2, ticker.set_text, ["CHANGED"]).start()
+    t0 = time.perf_counter()
+    blocks = zip(iter_ticker(ticker, fs, 100e3, sp), range(int(seconds / TICKER_BLOCK_S)))
+    st.feed((iq for iq, _ in blocks), "sc8"); st.finish(timeout=30)
+    got = proc.stdout.read().decode().split(); proc.wait(timeout=30)
+    wall = time.perf_counter() - t0
+    n = int(got[0]) if got else 0
+    sustained = n == st.bytes and st.underruns == 0 and n / wall > 0.9 * rate; ok &= sustained
+    log(f"sustained: {n/1e6:.1f} MB in {wall:.2f} s = {n/wall/1e6:.2f} MB/s (real time {rate/1e6:.2f} MB/s), "
+        f"underruns={st.underruns}, overruns={st.overruns} ({'OK' if sustained else 'FAILED'})")
+    return ok
+
+def _fake_radio(played):
+    # Stand-in radio: plays queued items one after another in real time, setting their marks
+    q = queue.Queue()
+    def run():
+        while True:
+            item, on, off = q.get()
+            on.set(); time.sleep(item["duration"]); off.set(); played.append(item["name"])
+    threading.Thread(target=run, daemon=True).start()
+    def queue_tx(item):
+        on, off = TxMark(), TxMark(); q.put((item, on, off)); return on, off
+    return queue_tx
+
+def selftest_playlist(log=print, max_gap_s=0.05):
+    """Items prepared during the previous item's air time start back to back, in order."""
+    jobs = [dict(JOB_DEFAULTS, name=n, text=n, w=512, h=32, speed=40.0) for n in ("CALL", "LOGO", "MSG")]
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = IQCache(os.path.join(tmp, "cache")); played = []
+        r = PlaylistRunner(jobs, lambda j: prepare_item(j, cache), _fake_radio(played), log)
+        t = time.perf_counter(); n = r.run(); wall = time.perf_counter() - t
+        air = sum(j["h"] / j["speed"] for j in jobs)
+        log(f"played {n} in {wall:.2f} s for {air:.2f} s of air time; serial playback would add ≈{r.prep_s:.2f} s")
+        ok = played == ["CALL", "LOGO", "MSG"] and len(r.gaps) == 2 and max(r.gaps) < max_gap_s
+        r2 = PlaylistRunner(jobs[:2], lambda j: prepare_item(j, cache), _fake_radio([]), log, loop=True)
+        threading.Timer(2.5 * jobs[0]["h"] / jobs[0]["speed"], r2.stop).start()
+        ok &= r2.run() >= 2 and cache.hits >= 2
+        log(f"loop: stopped after {r2.played} item(s), cache {cache.stats()}")
+        # Radio gone: logged and stopped, no exception
+        r3 = PlaylistRunner(jobs, lambda j: prepare_item(j, cache), lambda item: None, log)
+        ok &= r3.run() == 0
+        # Marks set on queueing (bladeRF-cli without echo): items are held back by their air time
+        def untimed(item):
+            on, off = TxMark(), TxMark(); on.set(); off.set(); return on, off
+        r4 = PlaylistRunner(jobs, lambda j: prepare_item(j, cache), untimed, log, timed=False)
+        t = time.perf_counter(); n = r4.run(); wall = time.perf_counter() - t
+        paced = n == 3 and wall >= 0.9 * air and not r4.gaps; ok &= paced
+        log(f"untimed: {n} item(s) in {wall:.2f} s for {air:.2f} s of air time ({'OK' if paced else 'FAILED'})")
+    return ok
+
+
+def selftest_bladerf(log=print):
+    """Command sync, error reports and the settings cache against a scripted bladeRF-cli."""
+    from sdrpainter_radio import BladeRFProc, Reply
+    lines = []; ok = True
+    cli = BladeRFProc(None, lines.append, argv=[sys.executable, FAKE_BLADERF_CLI])
+    if not cli.start(): return False
+    try:
+        settings = {"samplerate": 1_000_000, "frequency": 915_000_000, "bandwidth": 200_000, "gain": 10}
+        t = time.perf_counter(); good = cli.configure(settings); first = time.perf_counter() - t
+        t = time.perf_counter(); cli.configure(settings); again = time.perf_counter() - t
+        ok &= good and cli.skipped == 4 and first >= 0.08 and again < 0.01
+        log(f"configure: {first*1e3:.0f} ms, repeated {again*1e3:.1f} ms ({cli.skipped} skipped)")
+        r = cli.set("gain", 20); ok &= r is not None and r.ok and r.rtt >= 0.01
+        r = cli.set("bogus", 1); bad = r is not None and not r.ok and "bogus tx" not in cli.state
+        r = cli.command("frobnicate"); bad &= r is not None and not r.ok
+        ok &= bad; log(f"errors reported: {'OK' if bad else 'MISSED'}")
+        # Stop from the Tk thread races the worker's commands; replies must stay matched
+        threads = [threading.Thread(target=lambda: [cli.send("tx stop") for _ in range(50)]) for _ in range(3)]
+        for th in threads: th.start()
+        for i in range(20): ok &= bool(cli.command(f"set gain tx {i}", timeout=2.0).ok)
+        for th in threads: th.join()
+        with cli._lock: cli._pending.appendleft(Reply("lost", "sdrp-lost"))     # echo that never comes
+        t = time.perf_counter(); r = cli.command("set gain tx 21", timeout=2.0); lag = time.perf_counter() - t
+        sync = r.ok and lag < 1.0 and not cli._pending; ok &= sync
+        log(f"concurrent sends + lost echo: {'in sync' if sync else 'OUT OF SYNC'} ({lag*1e3:.0f} ms)")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tx.bin")
+            with open(path, "wb") as f: f.write(bytes(4 * 300_000))    # 0.3 s at 1 MS/s
+            t = time.perf_counter()
+            good = all(cli.command(c).ok for c in (f'tx config file="{path}" format=bin repeat=1', "tx start"))
+            good &= cli.command("tx wait", timeout=None).ok; wall = time.perf_counter() - t
+            ok &= good and 0.25 < wall < 1.0
+            log(f"tx start..wait: {wall*1e3:.0f} ms for 300 ms of samples ({'OK' if good else 'FAILED'})")
+            on, off = cli.queue_file(path, {"samplerate": 2_000_000})
+            timed = off.ev.wait(5) and on.t is not None and 0.1 < off.t - on.t < 0.5
+            ok &= bool(timed); log(f"queued play: {'OK' if timed else 'FAILED'}")
+            # FIFO TX (stream mode, ticker, compact formats): bladeRF-cli opens the FIFO inside
+            # tx start, so the writer must be running before that command can finish
+            fifo = make_fifo(os.path.join(tmp, "tx.fifo"))
+            if fifo:
+                feed = IQStreamer(lambda m: None); t = time.perf_counter()
+                good = cli.start_tx(fifo, {"samplerate": 2_000_000}, writer=lambda: feed.start(
+                    lambda: open(fifo, "wb"), lambda: unblock_fifo(fifo)))
+                t_start = time.perf_counter() - t
+                n = feed.feed_file(path, "sc16q11") if good else 0
+                if not good: feed.abort()
+                feed.finish(timeout=5.0)
+                r = cli.command("tx wait", timeout=5.0); cli.command("tx stop")
+                m = r is not None and re.search(r"(\d+) samples sent", " ".join(r.lines))
+                got = int(m.group(1)) if m else -1
+                good &= t_start < 1.0 and n == got == 300_000; ok &= good
+                log(f"FIFO tx: started in {t_start*1e3:.0f} ms, {got} of {n} samples read ({'OK' if good else 'FAILED'})")
+            dead = BladeRFProc(None, lines.append)
+            gone = dead.queue_file(path, {"samplerate": 2_000_000}) is None and not dead.state
+            ok &= gone; log(f"queue without bladeRF-cli: {'refused' if gone else 'FAILED'}")
+        cli.drain()
+    finally:
+        cli.stop()
+
+    slow = BladeRFProc(None, lines.append, argv=[sys.executable, FAKE_BLADERF_CLI, "--no-echo"])
+    if not slow.start(): return False
+    try:
+        slow.command("set gain tx 5", timeout=0.5); r = slow.set("gain", 6)
+        fb = slow.sync is False and r is not None and r.ok
+        ok &= fb; log(f"no-echo fallback: {'OK' if fb else 'FAILED'}")
+        slow.drain()
+    finally:
+        slow.stop()
+    errs = [l for l in lines if "ERROR" in l]
+    ok &= len(errs) == 2; log(f"{len(errs)} error line(s) logged, {sum('bladeRF>' in l for l in lines)} round-trip line(s)")
+    return ok
+
+def selftest_bands(log=print, fs=1_000_000, sp=20.0, H=64):
+    """Multi-band output equals the jointly normalized sum of the bands, with the requested balance."""
+    call = prepare_raster(render_text_bitmap("N0CALL", 384, H))
+    logo = prepare_raster(Image.fromarray(np.full((H, 256), 200, np.uint8)))
+    bands = [Band(call, 200_000, -300_000), Band(logo, 150_000, 100_000, gain_db=6.0)]
+    one = b"".join(bytes(c) for c in iter_iq_bands([Band(call, 200_000, 50_000)], fs, sp))
+    ok = one == b"".join(bytes(c) for c in iter_iq(call, fs, 200_000, sp, True, 50_000, engine="numpy"))
+    log(f"single band vs iter_iq: {'identical' if ok else 'DIFFERENT'}")
+
+    # Reference: each band synthesized on its own, summed, then DC-blocked and peak-normalized
+    sep = [RowSynth(b.img, fs, b.bw_hz, sp, True, b.fmin_hz).rows(0, H).reshape(-1) for b in bands]
+    for balance in BAND_BALANCE:
+        m = MultiBandSynth(bands, fs, sp, balance=balance)
+        ref = sum(g * x.astype(np.complex128) for g, x in zip(m.gains, sep))
+        ref -= ref.mean(); ref *= PEAK_SCALE / np.abs(ref).max()
+        iq = np.concatenate([c.copy() for c in iter_iq_bands(bands, fs, sp, balance=balance)])
+        err = float(np.abs(iq - ref).max())
+        spec = np.abs(np.fft.fftshift(np.fft.fft(iq.reshape(H, -1), axis=1)))**2
+        f = np.fft.fftshift(np.fft.fftfreq(spec.shape[1], 1 / fs))
+        pw = [spec[:, (f >= b.fmin_hz) & (f < b.fmax_hz)].sum() for b in bands]
+        ratio = 10 * np.log10(pw[1] / pw[0])
+        want = 6.0 if balance == "power" else 6.0 + 10 * np.log10(np.mean(sep[1].real**2 + sep[1].imag**2)
+                                                                   / np.mean(sep[0].real**2 + sep[0].imag**2))
+        good = err < 1e-4 and abs(ratio - want) < 0.5 and float(np.abs(iq).max()) <= PEAK_SCALE + 1e-4
+        ok &= good
+        log(f"balance {balance:5s}: max error {err:.1e} vs summed bands, band power ratio {ratio:+.1f} dB "
+            f"(want {want:+.1f}) ({'OK' if good else 'FAILED'})")
+
+    # One pass over both bands costs about the two single-band renders, in one render's memory
+    drain = lambda it: collections.deque(it, maxlen=0)
+    one = [_traced(lambda b=b: drain(iter_iq(b.img, fs, b.bw_hz, sp, True, b.fmin_hz, engine="numpy")))
+           for b in bands]
+    t_mb, m_mb = _traced(lambda: drain(iter_iq_bands(bands, fs, sp)))
+    t_one = sum(t for t, _ in one); m_one = max(m for _, m in one)
+    good = t_mb < 1.3 * t_one and m_mb < 1.6 * m_one; ok &= good
+    log(f"together {t_mb*1e3:.0f} ms, peak {m_mb/2**20:.1f} MiB; one by one {t_one*1e3:.0f} ms, "
+        f"peak {m_one/2**20:.1f} MiB per band ({'OK' if good else 'FAILED'})")
+    try:
+        MultiBandSynth([Band(call, 200_000, 400_000)], fs, sp); ok = False
+    except ValueError as e:
+        log(f"out of span rejected: {e}")
+    return ok
+
+def selftest_dc(log=print, max_err=2.0**-23):
+    """Analytic DC stays within max_err (of full scale) of the old np.mean-of-the-array output."""
+    ok = True; worst = 0.0; flips = 0; n = 0
+    for text, W, H, fs, bw, rps, usb in [("AB", 300, 40, 1e6, 5e4, 10.0, False), ("AB", 300, 40, 1e6, 5e4, 20.0, False),
+                                          ("AB", 300, 40, 1e6, 2e5, 60.0, False), ("HELLO", 1024, 128, 2e6, 1e5, 30.0, True),
+                                          ("X", 256, 256, 4e6, 3e5, 40.0, True)]:
+        img = prepare_raster(render_text_bitmap(text, W, H))
+        s = RowSynth(img, fs, bw, rps, usb); raw = s.rows(0, s.H).reshape(-1)
+        # The pre-streaming formula: mean and peak over the finished array
+        old = raw - np.mean(raw); old = (old / float(np.max(np.abs(old)) + 1e-9) * 0.95).astype(np.complex64)
+        new, _ = build_iq_mp(img, fs, bw, rps, usb, engine="numpy")
+        err = float(np.abs(new - old).max()); worst = max(worst, err)
+        for fmt in ("sc16q11", "sc8"):
+            d = np.abs(quantize(new, fmt).astype(np.int32) - quantize(old, fmt).astype(np.int32))
+            ok &= int(d.max()) <= 1; flips += int(np.count_nonzero(d)); n += d.size
+        ok &= err <= max_err
+    log(f"max deviation {worst:.1e} of full scale (bound {max_err:.1e}), "
+        f"{flips} of {n} quantized values off by 1 LSB ({'OK' if ok else 'FAILED'})")
+    return ok
+
+def selftest_cancel(log=print, W=512, H=256, fs=4_000_000, sp=40.0, max_stop_s=0.5):
+    """Cancelling midway stops within one row group, leaves no partial file and reports progress."""
+    img = prepare_raster(render_text_bitmap("STOP", W, H)); ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        def run(label, fn, leftover, at=0.4):
+            seen = []; t_cancel = []
+            def cb(frac, rate):
+                seen.append((frac, rate))
+                if frac >= at and not t_cancel: t_cancel.append(time.perf_counter()); tok.cancel()
+            tok = CancelToken(cb, interval=0.0)
+            try:
+                fn(tok); return False
+            except Cancelled:
+                lag = time.perf_counter() - t_cancel[0]
+            left = leftover()
+            good = lag < max_stop_s and not left and len(seen) > 2 and seen[-1][1] > 0
+            log(f"{label}: stopped {lag*1e3:.0f} ms after cancel at {seen[-1][0]:.0%} "
+                f"({seen[-1][1]/1e6:.1f} MS/s, {len(seen)} progress reports), "
+                f"partial file {'left behind' if left else 'removed'} ({'OK' if good else 'FAILED'})")
+            return good
+
+        out = os.path.join(tmp, "paint.bin"); painter = IncrementalPainter(out, "sc16q11", lambda m: None)
+        on_disk = lambda: os.path.exists(out)
+        ok &= run("rebuild", lambda tok: painter.update(img, fs, 100_000, sp, cancel=tok), on_disk)
+        ok &= painter._state is None
+        painter.update(img, fs, 100_000, sp)
+        edit = img.copy(); edit.paste(255, (0, 0, W, H // 2))
+        ok &= run("patch", lambda tok: painter.update(edit, fs, 100_000, sp, cancel=tok), on_disk, at=0.7)
+        cache = IQCache(os.path.join(tmp, "cache"))
+        job = dict(JOB_DEFAULTS, name="STOP", text="STOP", w=W, h=H, sr_mhz=fs / 1e6, speed=sp)
+        parts = lambda: [f for f in os.listdir(cache.root) if f.endswith(".part")]
+        ok &= run("playlist item", lambda tok: prepare_item(job, cache, cancel=tok), parts)
+    return ok
+
+SELFTESTS = {"stream": selftest_stream, "nco": selftest_nco, "writers": selftest_writers, "pool": selftest_pool,
+             "playlist": selftest_playlist, "ticker": selftest_ticker,
+             "bladerf": selftest_bladerf, "formats": selftest_formats,
+             "preview": selftest_preview, "dc": selftest_dc, "cancel": selftest_cancel,
+             "bands": selftest_bands}
+
+def run_selftests(names=None, log=print):
+    failed = []
+    for name in names or SELFTESTS:
+        log(f"== {name}")
+        if not SELFTESTS[name](log): failed.append(name)
+    log("selftest: " + (f"FAILED {', '.join(failed)}" if failed else "all passed"))
+    return 1 if failed else 0
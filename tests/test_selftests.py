@@ -0,0 +1,9 @@
+# pytest entry for the self-tests: one test per check, log lines shown on failure (or with -s).
+
+import pytest
+
+from tests.selftests import SELFTESTS
+
+@pytest.mark.parametrize("name", list(SELFTESTS))
+def test_selftest(name):
+    assert SELFTESTS[name](print), f"selftest {name} failed"